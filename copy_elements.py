@@ -1,6 +1,45 @@
+from lxml import etree
 from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.opc.packuri import PackURI
+from pptx.opc.serialized import PackageWriter, _ZipPkgWriter
+from pptx.oxml.ns import qn
+from pptx.parts.slide import SlidePart
+from pptx.util import Emu
 import copy
+import io
 import os
+import re
+import zipfile
+
+_READ_BUFFER_SIZE = 1 << 20
+
+# Part extensions whose content is already compressed; stored, not deflated
+_STORED_EXTENSIONS = frozenset((
+    'gif', 'jpeg', 'jpg', 'png',
+    'm4a', 'mp3', 'mp4', 'm4v',
+    'docx', 'pptx', 'xlsx',
+))
+_R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+# Clark-notation tag names resolved once, for element lookups in hot loops
+_A_EXT = qn('a:ext')
+_A_EXTLST = qn('a:extLst')
+_A_OFF = qn('a:off')
+_BG = qn('p:bg')
+_C_CHART = qn('c:chart')
+_CNVPR = qn('p:cNvPr')
+_CSLD = qn('p:cSld')
+_P_EXTLST = qn('p:extLst')
+_SP_TREE_PROPERTY_TAGS = frozenset((qn('p:nvGrpSpPr'), qn('p:grpSpPr'), _P_EXTLST))
+_R_ID = qn('r:id')
+
+# Relationships into the source deck's structure, which a copied shape can't keep
+_UNCOPIED_RELTYPES = frozenset((RT.SLIDE, RT.SLIDE_LAYOUT, RT.SLIDE_MASTER, RT.NOTES_SLIDE))
+
+# Trailing index of a partname, e.g. the 3 in /ppt/charts/chart3.xml
+_PARTNAME_INDEX_RE = re.compile(r'\d*(\.\w+)$')
 
 def merge_presentations(base_ppt_path, add_ppt_path, output_path):
     """
@@ -12,52 +51,164 @@ def merge_presentations(base_ppt_path, add_ppt_path, output_path):
         output_path (str): Path where the merged presentation will be saved
     """
     # Load both presentations
-    base_pres = Presentation(base_ppt_path)
-    add_pres = Presentation(add_ppt_path)
+    base_pres = open_presentation(base_ppt_path)
+    add_pres = open_presentation(add_ppt_path)
     
-    # Create a mapping of slide layouts
+    # Create a mapping of slide layouts, keyed by layout part since the
+    # SlideLayout proxies themselves are not hashable
     layout_mapping = {}
     
+    # Layout parts matched by name; their slides can be copied wholesale
+    same_layout_parts = set()
+    
+    # Walk each presentation's layouts and read their names once
+    add_layouts = tuple((sl, sl.name) for sl in add_pres.slide_layouts)
+    base_layouts = tuple((bl, bl.name) for bl in base_pres.slide_layouts)
+    
+    # Index the base layouts by name so each lookup below is O(1); built in
+    # reverse so the first layout wins when several share a name
+    base_by_name = {name: bl for bl, name in reversed(base_layouts)}
+    
     # First, check if we need to add new slide layouts
     # This is important for chart slides that depend on specific layouts
-    for slide_layout in add_pres.slide_layouts:
-        layout_name = slide_layout.name
-        layout_found = False
+    for slide_layout, layout_name in add_layouts:
+        base_layout = base_by_name.get(layout_name)
         
-        for base_layout in base_pres.slide_layouts:
-            if base_layout.name == layout_name:
-                layout_mapping[slide_layout] = base_layout
-                layout_found = True
-                break
-        
-        if not layout_found:
+        if base_layout is not None:
+            layout_mapping[slide_layout.part] = base_layout
+            same_layout_parts.add(slide_layout.part)
+        else:
             # Copy slide layout to base presentation
             # Note: python-pptx doesn't support direct layout copying,
             # but we can map to the closest match
-            layout_mapping[slide_layout] = find_closest_layout(base_pres, slide_layout)
+            layout_mapping[slide_layout.part] = find_closest_layout(base_pres, slide_layout, base_by_name)
+    
+    default_layout = base_layouts[0][0]
+    
+    # Allocate slide partnames from a local counter, scanning the package
+    # parts once up front rather than once per added slide
+    next_slide_idx = _next_slide_index(base_pres)
     
-    # Copy each slide from the second presentation to the first
+    # Copy each slide from the second presentation to the first. This stays
+    # serial: every copier writes into base_pres's package (new parts,
+    # relationships, shape ids), and python-pptx objects can't be shipped to
+    # worker processes, so slides aren't independent units of work here.
     for slide in add_pres.slides:
         # Get the layout that this slide is based on
         source_layout = slide.slide_layout
-        target_layout = layout_mapping.get(source_layout, base_pres.slide_layouts[0])
+        target_layout = layout_mapping.get(source_layout.part, default_layout)
         
         # Create a new slide in the base presentation with the matching layout
-        new_slide = base_pres.slides.add_slide(target_layout)
+        new_slide = add_slide(base_pres, target_layout, next_slide_idx)
+        next_slide_idx += 1
         
         # Copy slide contents
-        copy_slide_contents(slide, new_slide)
+        copy_slide_contents(slide, new_slide, source_layout.part in same_layout_parts)
     
     # Save the merged presentation
-    base_pres.save(output_path)
+    save_presentation(base_pres, output_path)
     print(f"Merged presentation saved to {output_path}")
 
-def find_closest_layout(pres, source_layout):
-    """Find the closest matching layout in the target presentation."""
+def open_presentation(path):
+    """
+    Open a presentation through a large read buffer.
+    
+    zipfile seeks to and reads every member separately; a 1 MiB buffer turns
+    those many small reads into a handful of large ones. python-pptx reads all
+    parts while loading, so the file can be closed as soon as it returns.
+    """
+    with open(path, 'rb', buffering=_READ_BUFFER_SIZE) as f:
+        return Presentation(f)
+
+def _next_slide_index(pres):
+    """Return the first free N for a /ppt/slides/slideN.xml partname."""
+    slide_indices = [
+        part.partname.idx for part in pres.part.package.iter_parts()
+        if part.partname.startswith('/ppt/slides/slide')
+    ]
+    return max(slide_indices, default=0) + 1
+
+def add_slide(pres, slide_layout, slide_idx):
+    """
+    Add a slide based on slide_layout, stored at /ppt/slides/slide<slide_idx>.xml.
+    
+    This mirrors SlideCollection.add_slide(), except that the caller supplies
+    the partname index. python-pptx derives it from the slide count, which
+    collides with existing parts when the deck's slide numbering has gaps.
+    """
+    prs_part = pres.part
+    partname = PackURI(f'/ppt/slides/slide{slide_idx}.xml')
+    slide_part = SlidePart.new(partname, prs_part.package, slide_layout.part)
+    rId = prs_part.relate_to(slide_part, RT.SLIDE)
+    
+    slide = slide_part.slide
+    slide.shapes.clone_layout_placeholders(slide_layout)
+    pres.slides._sldIdLst.add_sldId(rId)
+    return slide
+
+class _StoredMediaZipPkgWriter(_ZipPkgWriter):
+    """
+    Zip package writer that stores already-compressed parts as-is.
+    
+    python-pptx deflates every member; for images, media and embedded Office
+    files that costs time and usually makes the member larger.
+    """
+    
+    def write(self, pack_uri, blob):
+        if pack_uri.ext.lower() in _STORED_EXTENSIONS:
+            compress_type = zipfile.ZIP_STORED
+        else:
+            compress_type = None  # The archive default, ZIP_DEFLATED
+        self._zipf.writestr(pack_uri.membername, blob, compress_type=compress_type)
+
+class _StoredMediaPackageWriter(PackageWriter):
+    """PackageWriter that writes through _StoredMediaZipPkgWriter."""
+    
+    def _write(self):
+        with _StoredMediaZipPkgWriter(self._pkg_file) as phys_writer:
+            self._write_content_types_stream(phys_writer)
+            self._write_pkg_rels(phys_writer)
+            self._write_parts(phys_writer)
+
+def save_presentation(pres, path):
+    """
+    Save pres like Presentation.save(), without re-deflating compressed media.
+    
+    The archive is assembled in memory and written out in one call to a
+    temporary file, which then replaces path. A failed save never leaves a
+    truncated file behind.
+    """
+    package = pres.part.package
+    buffer = io.BytesIO()
+    _StoredMediaPackageWriter.write(buffer, package._rels, tuple(package.iter_parts()))
+    
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def find_closest_layout(pres, source_layout, layouts_by_name=None):
+    """
+    Find the closest matching layout in the target presentation.
+    
+    Args:
+        pres: The target presentation
+        source_layout: The layout to find a match for
+        layouts_by_name (dict): Optional pre-built {name: layout} index of
+            ``pres.slide_layouts``; built on the fly when not supplied
+    """
+    if layouts_by_name is None:
+        layouts_by_name = {layout.name: layout for layout in reversed(pres.slide_layouts)}
+    
     # First try to match by name
-    for layout in pres.slide_layouts:
-        if layout.name == source_layout.name:
-            return layout
+    layout = layouts_by_name.get(source_layout.name)
+    if layout is not None:
+        return layout
     
     # If no match by name, try to match by type/purpose
     # This is a simplified version; you might need to expand this logic
@@ -76,45 +227,104 @@ def find_closest_layout(pres, source_layout):
     
     source_type = layout_types.get(source_layout.name, 1)  # Default to Title and Content
     
-    # Return the matching layout or default to Title and Content (index 1)
-    try:
-        return pres.slide_layouts[source_type]
-    except IndexError:
-        return pres.slide_layouts[1]  # Default to Title and Content
+    # Return the matching layout or default to Title and Content (index 1),
+    # or the only layout in single-layout templates
+    layouts = pres.slide_layouts
+    layout_count = len(layouts)
+    if source_type < layout_count:
+        return layouts[source_type]
+    return layouts[min(1, layout_count - 1)]
 
-def copy_slide_contents(source_slide, target_slide):
+def copy_slide_contents(source_slide, target_slide, same_layout=False):
     """
     Copy the contents of a slide to another slide.
     
     This function handles shapes, placeholders, charts, tables, etc.
+    
+    Args:
+        source_slide: The slide to copy from
+        target_slide: The slide to copy into
+        same_layout (bool): True when target_slide's layout is the source
+            layout's same-named counterpart, so the source shape tree,
+            placeholders included, is valid on the target as-is
     """
-    # Copy slide background
-    if source_slide.background.fill.type != 0:  # 0 means no fill
-        target_slide.background = copy.deepcopy(source_slide.background)
+    # Copy slide background, but only when the slide defines its own <p:bg>;
+    # otherwise it is inherited from the layout and there is nothing to copy.
+    # (Going through background.fill would add an empty <p:bg> to the source.)
+    bg = source_slide._element.find(_CSLD).find(_BG)
+    if bg is not None and _is_self_contained(bg):
+        target_cSld = target_slide._element.find(_CSLD)
+        old_bg = target_cSld.find(_BG)
+        if old_bg is not None:
+            target_cSld.remove(old_bg)
+        # <p:bg> is always the first child of <p:cSld>
+        target_cSld.insert(0, copy.deepcopy(bg))
+    
+    if same_layout:
+        _copy_sp_tree(source_slide, target_slide)
+        return
+    
+    # Index the target's placeholders once for all placeholder shapes below
+    placeholders_by_idx = _placeholders_by_idx(target_slide)
     
     # Handle shapes (including charts)
     for shape in source_slide.shapes:
-        if shape.shape_type == 1:  # Auto Shape
-            copy_auto_shape(shape, target_slide)
-        elif shape.shape_type == 3:  # Chart
-            copy_chart(shape, target_slide)
-        elif shape.shape_type == 6:  # Group Shape
-            copy_group_shape(shape, target_slide)
-        elif shape.shape_type == 7:  # Textbox
-            copy_textbox(shape, target_slide)
-        elif shape.shape_type == 8:  # Picture
-            copy_picture(shape, target_slide)
-        elif shape.shape_type == 14:  # Placeholder
-            copy_placeholder(shape, target_slide)
-        elif shape.shape_type == 19:  # Table
-            copy_table(shape, target_slide)
+        _copy_shape(shape, target_slide, placeholders_by_idx)
+
+def _copy_shape(shape, target_slide, placeholders_by_idx):
+    """Copy one shape with the copier for its type, reading shape_type once."""
+    shape_type = shape.shape_type
+    if shape_type == MSO_SHAPE_TYPE.PLACEHOLDER:
+        copy_placeholder(shape, target_slide, placeholders_by_idx)
+    else:
+        # Shape types without a dedicated copier get a generic shape
+        _SHAPE_COPIERS.get(shape_type, copy_generic_shape)(shape, target_slide)
+
+def _copy_sp_tree(source_slide, target_slide):
+    """
+    Replace the target slide's shapes with clones of the source slide's.
+    
+    Used when both slides share a layout: the placeholders add_slide() cloned
+    from the layout are dropped in favour of the source's own, and every
+    self-contained shape is cloned with its id unchanged. Shapes that
+    reference other parts (pictures, charts, ...) still go through their
+    copiers so their parts are brought across.
+    
+    All the clones go in first, so every source id is taken before a copier
+    allocates one (max + 1) for its new shape. A comment holds the place of
+    each copied shape until its copy is moved there.
+    """
+    target_tree = target_slide.shapes._spTree
+    for child in list(target_tree):
+        if child.tag not in _SP_TREE_PROPERTY_TAGS:
+            target_tree.remove(child)
+    
+    copied = []
+    for shape in source_slide.shapes:
+        element = shape._element
+        if _is_self_contained(element):
+            _insert_before(target_tree, copy.deepcopy(element), _P_EXTLST)
         else:
-            # For other shape types, create a generic shape
-            copy_generic_shape(shape, target_slide)
+            marker = etree.Comment(' copied shape ')
+            _insert_before(target_tree, marker, _P_EXTLST)
+            copied.append((shape, marker))
+    
+    for shape, marker in copied:
+        # Copiers append their shapes to the tree; move them to the marker
+        existing = set(target_tree)
+        _copy_shape(shape, target_slide, {})
+        for child in list(target_tree):
+            if child not in existing:
+                marker.addprevious(child)
+        target_tree.remove(marker)
 
 def copy_auto_shape(shape, slide):
     """Copy an auto shape to the target slide."""
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
+    if _is_self_contained(shape._element):
+        _clone_sp(shape, slide.shapes)
+        return
+    
+    left, top, width, height = _ltwh(shape)
     
     # Add a new shape
     new_shape = slide.shapes.add_shape(
@@ -129,64 +339,111 @@ def copy_chart(shape, slide):
     """
     Copy a chart to the target slide.
     
-    This method doesn't directly copy the chart but creates a placeholder with a
-    note about the chart's presence. You may need to enhance this based on your needs.
+    The chart part (and the parts it relates to, such as the embedded
+    workbook) is copied byte-for-byte into the target package, and the
+    source <p:graphicFrame> is cloned with its r:id pointed at the copy.
     """
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
+    slide_part = slide.part
+    source_chart_part = shape.chart_part
     
-    # Create a textbox to indicate the chart's presence
-    txbox = slide.shapes.add_textbox(left, top, width, height)
-    tf = txbox.text_frame
+    new_chart_part = _clone_part(source_chart_part, slide_part.package)
+    rId = slide_part.relate_to(new_chart_part, RT.CHART)
+    _copy_part_rels(source_chart_part, new_chart_part)
     
-    # Add text noting this is a chart
-    if hasattr(shape, 'chart') and hasattr(shape.chart, 'chart_type'):
-        chart_type = shape.chart.chart_type
-        p = tf.add_paragraph()
-        p.text = f"Chart (Type: {chart_type})"
-        p.font.bold = True
-        p.font.size = 14
-    else:
-        p = tf.add_paragraph()
-        p.text = "Chart placeholder"
-        p.font.bold = True
-        p.font.size = 14
+    new_el = _clone_sp(shape, slide.shapes)
+    new_el.find('.//' + _C_CHART).set(_R_ID, rId)
+
+def _clone_part(part, package):
+    """
+    Create a copy of part under a fresh partname in package.
+    
+    The copy has no relationships yet. Relate it to its parent before cloning
+    further parts, since next_partname() only sees parts reachable from the
+    package root.
+    """
+    partname_template = _PARTNAME_INDEX_RE.sub(r'%d\1', part.partname)
+    partname = package.next_partname(partname_template)
+    return type(part).load(partname, part.content_type, package, part.blob)
+
+def _copy_part_rels(source_part, new_part):
+    """Recreate source_part's relationships on its copy, cloning target parts."""
+    rId_map = {}
+    for rel in source_part.rels.values():
+        if rel.is_external:
+            rId_map[rel.rId] = new_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+            continue
+        
+        new_target = _clone_part(rel.target_part, new_part.package)
+        rId_map[rel.rId] = new_part.relate_to(new_target, rel.reltype)
+        _copy_part_rels(rel.target_part, new_target)
+    
+    # XML parts refer to their relationships by rId; point those at the new ids
+    element = getattr(new_part, '_element', None)
+    if element is None:
+        return
+    for el in element.iter():
+        for attr, value in el.attrib.items():
+            if attr.startswith(_R_NS) and value in rId_map:
+                el.set(attr, rId_map[value])
 
 def copy_group_shape(shape, slide):
     """Copy a group shape to the target slide."""
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
-    
-    # Create a group shape container
+    # Create a group shape container and give it the source group's
+    # transform, so cloned children keep their child-space coordinates
     group = slide.shapes.add_group_shape()
-    group.left = left
-    group.top = top
-    group.width = width
-    group.height = height
+    grpSpPr = group._element.grpSpPr
+    grpSpPr.getparent().replace(grpSpPr, copy.deepcopy(shape._element.grpSpPr))
     
-    # Loop through shapes in the group and add them
+    # Clone every child as-is. Going through group.shapes.add_shape() and
+    # friends would recalculate the group's extents over the copied transform.
     for child_shape in shape.shapes:
-        # Adjust coordinates relative to the group
-        child_left = child_shape.left - shape.left
-        child_top = child_shape.top - shape.top
-        
-        if child_shape.shape_type == 1:  # Auto Shape
-            new_shape = group.shapes.add_shape(
-                child_shape.auto_shape_type, 
-                child_left, child_top, 
-                child_shape.width, child_shape.height
-            )
-            copy_shape_properties(child_shape, new_shape)
-            copy_text_frame(child_shape, new_shape)
-        elif child_shape.shape_type == 7:  # Textbox
-            new_shape = group.shapes.add_textbox(
-                child_left, child_top,
-                child_shape.width, child_shape.height
-            )
-            copy_text_frame(child_shape, new_shape)
-        # Add more conditions for other shape types as needed
+        new_el = _clone_sp(child_shape, group.shapes)
+        if not _is_self_contained(new_el):
+            _copy_shape_rels(new_el, shape.part, slide.part)
+
+def _copy_shape_rels(element, source_part, target_part):
+    """
+    Point a cloned shape's relationship references (r:id, r:embed, ...) at
+    copies of their targets related from target_part.
+    
+    Images go through the target's image parts, so identical ones are
+    shared; external links are recreated, and other parts (charts, embedded
+    objects, ...) are cloned along with their own relationships. Links to the
+    source deck's slides, layouts and masters can't carry over and are
+    cleared.
+    """
+    rId_map = {}
+    for el in element.iter():
+        for attr, value in el.attrib.items():
+            if not attr.startswith(_R_NS) or not value:
+                continue
+            if value not in rId_map:
+                rel = source_part.rels.get(value)
+                rId_map[value] = '' if rel is None else _copy_rel(rel, target_part)
+            el.set(attr, rId_map[value])
+
+def _copy_rel(rel, target_part):
+    """Recreate a shape's relationship on target_part; return the new rId, or '' if dropped."""
+    if rel.is_external:
+        return target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+    if rel.reltype in _UNCOPIED_RELTYPES:
+        return ''
+    if rel.reltype == RT.IMAGE:
+        _, rId = target_part.get_or_add_image_part(io.BytesIO(rel.target_part.blob))
+        return rId
+    
+    new_target = _clone_part(rel.target_part, target_part.package)
+    rId = target_part.relate_to(new_target, rel.reltype)
+    _copy_part_rels(rel.target_part, new_target)
+    return rId
 
 def copy_textbox(shape, slide):
     """Copy a textbox to the target slide."""
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
+    if _is_self_contained(shape._element):
+        _clone_sp(shape, slide.shapes)
+        return
+    
+    left, top, width, height = _ltwh(shape)
     
     # Create a new textbox
     new_shape = slide.shapes.add_textbox(left, top, width, height)
@@ -196,48 +453,34 @@ def copy_textbox(shape, slide):
 
 def copy_picture(shape, slide):
     """Copy a picture to the target slide."""
-    # For pictures, we need to save the image temporarily and then add it
-    # This is a limitation of python-pptx
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
-    
-    # Create a temporary file for the image
-    temp_image_path = "temp_image.png"
+    # add_picture accepts a file-like object, so the image blob is handed
+    # over in memory rather than through a temporary file on disk
+    left, top, width, height = _ltwh(shape)
     
     try:
-        # Try to save the image
-        with open(temp_image_path, "wb") as f:
-            if hasattr(shape, "image") and shape.image:
-                f.write(shape.image.blob)
-                # Add the image to the new slide
-                slide.shapes.add_picture(temp_image_path, left, top, width, height)
-            else:
-                # If we can't get the image, create a placeholder
-                txbox = slide.shapes.add_textbox(left, top, width, height)
-                txbox.text_frame.text = "Image placeholder"
+        # Raises ValueError for a linked picture, which embeds no image
+        slide.shapes.add_picture(io.BytesIO(shape.image.blob), left, top, width, height)
     except Exception as e:
         print(f"Error copying image: {e}")
         # Create a placeholder instead
         txbox = slide.shapes.add_textbox(left, top, width, height)
         txbox.text_frame.text = "Image placeholder"
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_image_path):
-            os.remove(temp_image_path)
 
-def copy_placeholder(shape, slide):
-    """Copy a placeholder to the target slide."""
+def copy_placeholder(shape, slide, placeholders_by_idx=None):
+    """
+    Copy a placeholder to the target slide.
+    
+    Args:
+        shape: The source placeholder shape
+        slide: The target slide
+        placeholders_by_idx (dict): Optional {idx: placeholder} index of the
+            target slide's placeholders; built on the fly when not supplied
+    """
+    if placeholders_by_idx is None:
+        placeholders_by_idx = _placeholders_by_idx(slide)
+    
     # Find a matching placeholder by index in the target slide
-    target_placeholders = [p for p in slide.placeholders]
-    
-    # Try to find a placeholder with the same index
-    target_placeholder = None
-    if hasattr(shape, 'placeholder_format') and hasattr(shape.placeholder_format, 'idx'):
-        idx = shape.placeholder_format.idx
-        for p in target_placeholders:
-            if hasattr(p, 'placeholder_format') and hasattr(p.placeholder_format, 'idx'):
-                if p.placeholder_format.idx == idx:
-                    target_placeholder = p
-                    break
+    target_placeholder = placeholders_by_idx.get(shape.placeholder_format.idx)
     
     if target_placeholder:
         # If we found a matching placeholder, copy the content
@@ -246,10 +489,14 @@ def copy_placeholder(shape, slide):
     else:
         # If no matching placeholder, create a textbox with the content
         if shape.has_text_frame:
-            left, top, width, height = shape.left, shape.top, shape.width, shape.height
+            left, top, width, height = _ltwh(shape)
             txbox = slide.shapes.add_textbox(left, top, width, height)
             copy_text_frame(shape, txbox)
 
+def _placeholders_by_idx(slide):
+    """Return a {placeholder_format.idx: placeholder} dict for a slide."""
+    return {p.placeholder_format.idx: p for p in slide.placeholders}
+
 def copy_table(shape, slide):
     """Copy a table to the target slide."""
     if not hasattr(shape, 'table'):
@@ -257,87 +504,167 @@ def copy_table(shape, slide):
     
     source_table = shape.table
     rows, cols = len(source_table.rows), len(source_table.columns)
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
+    left, top, width, height = _ltwh(shape)
     
     # Create a new table
     new_table = slide.shapes.add_table(rows, cols, left, top, width, height).table
     
-    # Copy table contents and formatting
-    for i, row in enumerate(source_table.rows):
-        for j, cell in enumerate(row.cells):
-            target_cell = new_table.cell(i, j)
+    # Copy table contents and formatting by cloning each cell's text body
+    # and cell properties, which keeps runs, fills and borders intact
+    for source_row, target_row in zip(source_table.rows, new_table.rows):
+        for cell, target_cell in zip(source_row.cells, target_row.cells):
+            source_tc, target_tc = cell._tc, target_cell._tc
+            
+            # Merge attributes (gridSpan, rowSpan, hMerge, vMerge)
+            target_tc.attrib.update(source_tc.attrib)
+            
+            for child in (target_tc.txBody, target_tc.tcPr):
+                if child is not None:
+                    target_tc.remove(child)
             
-            # Copy text content
-            if cell.text_frame:
-                target_cell.text = cell.text
-                
-                # Copy paragraph formatting if possible
-                if hasattr(cell.text_frame, 'paragraphs') and cell.text_frame.paragraphs:
-                    for p_idx, paragraph in enumerate(cell.text_frame.paragraphs):
-                        if p_idx < len(target_cell.text_frame.paragraphs):
-                            target_paragraph = target_cell.text_frame.paragraphs[p_idx]
-                            if hasattr(paragraph, 'font') and hasattr(target_paragraph, 'font'):
-                                if hasattr(paragraph.font, 'bold'):
-                                    target_paragraph.font.bold = paragraph.font.bold
-                                if hasattr(paragraph.font, 'italic'):
-                                    target_paragraph.font.italic = paragraph.font.italic
-                                if hasattr(paragraph.font, 'color') and paragraph.font.color.rgb:
-                                    target_paragraph.font.color.rgb = paragraph.font.color.rgb
+            # txBody must precede tcPr; both go ahead of any extLst
+            for child in (source_tc.txBody, source_tc.tcPr):
+                if child is not None:
+                    _insert_before(target_tc, copy.deepcopy(child), _A_EXTLST)
 
 def copy_generic_shape(shape, slide):
-    """Create a generic placeholder for unsupported shape types."""
-    left, top, width, height = shape.left, shape.top, shape.width, shape.height
+    """Copy an unsupported shape type, or create a generic placeholder for it."""
+    if _is_self_contained(shape._element):
+        _clone_sp(shape, slide.shapes)
+        return
+    
+    left, top, width, height = _ltwh(shape)
     
     # Create a textbox as a placeholder
     txbox = slide.shapes.add_textbox(left, top, width, height)
     tf = txbox.text_frame
     tf.text = f"Shape placeholder (Type: {shape.shape_type})"
 
+def _ltwh(shape):
+    """
+    Return a shape's (left, top, width, height), reading its xfrm only once.
+    
+    The left/top/width/height properties each look the transform up again.
+    """
+    xfrm = shape._element.xfrm
+    if xfrm is not None:
+        off = xfrm.find(_A_OFF)
+        ext = xfrm.find(_A_EXT)
+        if off is not None and ext is not None:
+            return (
+                Emu(int(off.get('x'))), Emu(int(off.get('y'))),
+                Emu(int(ext.get('cx'))), Emu(int(ext.get('cy'))),
+            )
+    
+    # No transform of its own, e.g. a placeholder positioned by its layout
+    return shape.left, shape.top, shape.width, shape.height
+
+def _is_self_contained(element):
+    """
+    Check that a shape element has no relationship references (r:id, r:embed, ...).
+    
+    Such elements can be cloned into another slide as-is; anything pointing at
+    a part of the source slide would be left dangling by a plain XML copy.
+    """
+    for el in element.iter():
+        for attr in el.attrib:
+            if attr.startswith(_R_NS):
+                return False
+    return True
+
+def _clone_sp(source_shape, shapes):
+    """
+    Deep-copy a shape's XML element into a shape collection.
+    
+    This keeps all styling, effects and text in a single lxml clone instead of
+    rebuilding the shape property by property. Shape ids are renumbered so they
+    stay unique on the target slide.
+    """
+    # lxml implements __deepcopy__ as a single C-level node copy; it is
+    # several times faster than an etree.tostring()/parse_xml() round-trip
+    # and keeps python-pptx's custom element classes on the clone
+    new_el = copy.deepcopy(source_shape._element)
+    
+    next_id = shapes._next_shape_id
+    for c_nv_pr in new_el.iter(_CNVPR):
+        c_nv_pr.set('id', str(next_id))
+        next_id += 1
+    
+    _insert_before(shapes._spTree, new_el, _P_EXTLST)
+    return new_el
+
+def _insert_before(parent, element, successor_tag):
+    """Insert element ahead of parent's first successor_tag child, else append it."""
+    successor = parent.find(successor_tag)
+    if successor is None:
+        parent.append(element)
+    else:
+        successor.addprevious(element)
+
 def copy_shape_properties(source, target):
     """Copy common shape properties from source to target."""
     # Copy fill
-    if hasattr(source, 'fill') and hasattr(target, 'fill'):
-        if source.fill.type == 1:  # Solid fill
-            if source.fill.fore_color.rgb:
-                target.fill.solid()
-                target.fill.fore_color.rgb = source.fill.fore_color.rgb
-        elif source.fill.type == 0:  # No fill
-            target.fill.background()
+    try:
+        source_fill, target_fill = source.fill, target.fill
+    except AttributeError:
+        pass
+    else:
+        fill_type = source_fill.type
+        if fill_type == 1:  # Solid fill
+            rgb = _color_rgb(source_fill.fore_color)
+            if rgb:
+                target_fill.solid()
+                target_fill.fore_color.rgb = rgb
+        elif fill_type == 0:  # No fill
+            target_fill.background()
     
     # Copy line properties
-    if hasattr(source, 'line') and hasattr(target, 'line'):
-        if hasattr(source.line, 'color') and source.line.color.rgb:
-            target.line.color.rgb = source.line.color.rgb
-        
-        if hasattr(source.line, 'width'):
-            target.line.width = source.line.width
+    try:
+        source_line, target_line = source.line, target.line
+    except AttributeError:
+        return
+    
+    rgb = _color_rgb(source_line.color)
+    if rgb:
+        target_line.color.rgb = rgb
+    
+    target_line.width = source_line.width
+
+def _color_rgb(color):
+    """Return the RGB value of a color format, or None if it has no RGB value."""
+    # python-pptx raises AttributeError from .rgb for colors without a type
+    try:
+        return color.rgb
+    except AttributeError:
+        return None
 
 def copy_text_frame(source, target):
     """Copy text frame content and formatting from source to target."""
-    if not (hasattr(source, 'text_frame') and hasattr(target, 'text_frame')):
+    try:
+        source_tf = source.text_frame
+        target_tf = target.text_frame
+    except AttributeError:
         return
     
-    source_tf = source.text_frame
-    target_tf = target.text_frame
-    
     # Copy text frame properties
-    if hasattr(source_tf, 'word_wrap') and hasattr(target_tf, 'word_wrap'):
-        target_tf.word_wrap = source_tf.word_wrap
+    target_tf.word_wrap = source_tf.word_wrap
     
-    # Clear existing paragraphs in target (except first one)
-    while len(target_tf.paragraphs) > 1:
-        p = target_tf.paragraphs[-1]
+    # Clear existing paragraphs in target (except first one); the paragraphs
+    # property re-runs an XPath query, so materialize it once
+    target_paragraphs = target_tf.paragraphs
+    for p in target_paragraphs[1:]:
         p._p.getparent().remove(p._p)
     
     # Get the first (and possibly only) paragraph in the target
-    if not target_tf.paragraphs:
+    if not target_paragraphs:
         target_para = target_tf.add_paragraph()
     else:
-        target_para = target_tf.paragraphs[0]
+        target_para = target_paragraphs[0]
         target_para.text = ""
     
     # Copy paragraphs
-    for i, source_para in enumerate(source_tf.paragraphs):
+    source_paragraphs = source_tf.paragraphs
+    for i, source_para in enumerate(source_paragraphs):
         if i == 0:
             # Use the existing first paragraph
             para = target_para
@@ -349,25 +676,34 @@ def copy_text_frame(source, target):
         para.text = source_para.text
         
         # Copy paragraph formatting
-        if hasattr(source_para, 'alignment') and hasattr(para, 'alignment'):
-            para.alignment = source_para.alignment
+        para.alignment = source_para.alignment
         
-        # Copy font formatting
-        if hasattr(source_para, 'font') and hasattr(para, 'font'):
-            if hasattr(source_para.font, 'size') and source_para.font.size:
-                para.font.size = source_para.font.size
-            
-            if hasattr(source_para.font, 'bold'):
-                para.font.bold = source_para.font.bold
-            
-            if hasattr(source_para.font, 'italic'):
-                para.font.italic = source_para.font.italic
-            
-            if hasattr(source_para.font, 'underline'):
-                para.font.underline = source_para.font.underline
-            
-            if hasattr(source_para.font, 'color') and source_para.font.color.rgb:
-                para.font.color.rgb = source_para.font.color.rgb
+        # Copy font formatting, reading each font proxy only once
+        sfont = source_para.font
+        tfont = para.font
+        
+        size = sfont.size
+        if size:
+            tfont.size = size
+        
+        tfont.bold = sfont.bold
+        tfont.italic = sfont.italic
+        tfont.underline = sfont.underline
+        
+        rgb = _color_rgb(sfont.color)
+        if rgb:
+            tfont.color.rgb = rgb
+
+# Shape copiers keyed by shape_type, used by copy_slide_contents. Placeholders
+# are handled there directly since they also take the placeholder index.
+_SHAPE_COPIERS = {
+    MSO_SHAPE_TYPE.AUTO_SHAPE: copy_auto_shape,
+    MSO_SHAPE_TYPE.CHART: copy_chart,
+    MSO_SHAPE_TYPE.GROUP: copy_group_shape,
+    MSO_SHAPE_TYPE.TEXT_BOX: copy_textbox,
+    MSO_SHAPE_TYPE.PICTURE: copy_picture,
+    MSO_SHAPE_TYPE.TABLE: copy_table,
+}
 
 # Example usage
 if __name__ == "__main__":
@@ -1,222 +1,358 @@
 import zipfile
+import io
 import os
+import posixpath
 import shutil
-import xml.etree.ElementTree as ET
-from tempfile import mkdtemp
+import struct
+from lxml import etree as ET
 import re
 
+# libxml2 parser shared by every parse; huge_tree lifts the depth/size limits
+# that large slide XML can hit
+_XML_PARSER = ET.XMLParser(remove_blank_text=False, huge_tree=True)
+
+# Compiled once: every element carrying an Id attribute (relationship entries)
+_ELEMENTS_WITH_ID = ET.XPath('//*[@Id]')
+
+# Namespace part of a Clark-notation tag
+_NAMESPACE_PATTERN = re.compile(r'\{([^}]*)\}')
+
+# Numbered relationship Id, e.g. rId12
+_REL_ID_PATTERN = re.compile(r'rId(\d+)')
+
+# Buffer size for copies that can't go through sendfile
+_COPY_BUFFER_SIZE = 128 * 1024
+
+# Compression methods whose raw bytes can be moved between archives as-is
+_RAW_COPY_METHODS = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
 def merge_pptx_files(pptx1_path, pptx2_path, output_path):
     """
     Merge two PPTX files by working with their underlying XML structure.
-    
+
+    Both packages are read straight from their zip archives; only the XML
+    parts that change are parsed and rewritten in memory.
+
     Args:
         pptx1_path (str): Path to the first PPTX file
         pptx2_path (str): Path to the second PPTX file
-        output_path (str): Path where the merged PPTX file will be saved
+        output_path (str): Path where the merged PPTX file will be saved;
+            '.pptx' is appended unless it already has that extension
     """
-    # Create a temporary directory for our work
-    temp_dir = mkdtemp()
-    
-    # Extract the first PPTX (this will be our base)
-    base_dir = os.path.join(temp_dir, "base")
-    os.makedirs(base_dir)
-    
-    with zipfile.ZipFile(pptx1_path, 'r') as zip_ref:
-        zip_ref.extractall(base_dir)
-    
-    # Extract the second PPTX
-    second_dir = os.path.join(temp_dir, "second")
-    os.makedirs(second_dir)
-    
-    with zipfile.ZipFile(pptx2_path, 'r') as zip_ref:
-        zip_ref.extractall(second_dir)
-    
-    # Read presentation.xml files to get the slide counts and relations
-    pres1_xml_path = os.path.join(base_dir, "ppt", "presentation.xml")
-    pres2_xml_path = os.path.join(second_dir, "ppt", "presentation.xml")
-    
-    tree1 = ET.parse(pres1_xml_path)
-    root1 = tree1.getroot()
-    
-    tree2 = ET.parse(pres2_xml_path)
-    root2 = tree2.getroot()
-    
-    # Find the namespace
-    ns_match = re.match(r'{(.*)}', root1.tag)
-    ns = ns_match.group(1) if ns_match else None
-    ns_dict = {'p': ns} if ns else {}
-    
-    # Find sldIdLst element (contains slide references)
-    slide_id_list1 = root1.find('.//p:sldIdLst', ns_dict)
-    slide_id_list2 = root2.find('.//p:sldIdLst', ns_dict)
-    
-    if slide_id_list1 is None or slide_id_list2 is None:
-        raise ValueError("Could not find slide ID list in one of the presentations")
-    
-    # Get the highest slide ID from the first presentation
-    max_id = 0
-    for slide in slide_id_list1.findall('.//p:sldId', ns_dict):
-        id_val = int(slide.get('id', '0'))
-        max_id = max(max_id, id_val)
-    
-    # Get the highest rId from the first presentation's relationship file
-    rels_path = os.path.join(base_dir, "ppt", "_rels", "presentation.xml.rels")
-    rels_tree = ET.parse(rels_path)
-    rels_root = rels_tree.getroot()
-    
-    max_rel_id = 0
-    for rel in rels_root.findall('.//*[@Id]'):
-        rid = rel.get('Id', '')
-        if rid.startswith('rId'):
-            try:
-                rid_num = int(rid[3:])
-                max_rel_id = max(max_rel_id, rid_num)
-            except ValueError:
+    with zipfile.ZipFile(pptx1_path, 'r') as zip1, zipfile.ZipFile(pptx2_path, 'r') as zip2:
+        # Output entries, starting from the first PPTX (this will be our base).
+        # Members copied unchanged are held as (zip, info); rewritten ones as bytes.
+        parts = {info.filename: (zip1, info) for info in zip1.infolist()}
+
+        # Read presentation.xml files to get the slide counts and relations
+        pres1_xml_path = "ppt/presentation.xml"
+
+        root1 = parse_xml(zip1.read(pres1_xml_path))
+        root2 = parse_xml(zip2.read("ppt/presentation.xml"))
+
+        # Find the namespace
+        ns_match = _NAMESPACE_PATTERN.match(root1.tag)
+        ns = ns_match.group(1) if ns_match else None
+        ns_dict = {'p': ns} if ns else {}
+
+        # Find sldIdLst element (contains slide references)
+        slide_id_list1 = root1.find('.//p:sldIdLst', ns_dict)
+        slide_id_list2 = root2.find('.//p:sldIdLst', ns_dict)
+
+        if slide_id_list1 is None or slide_id_list2 is None:
+            raise ValueError("Could not find slide ID list in one of the presentations")
+
+        # Get the highest slide ID from the first presentation
+        max_id = 0
+        for slide in slide_id_list1.iterfind('.//p:sldId', ns_dict):
+            id_val = int(slide.get('id', '0'))
+            max_id = max(max_id, id_val)
+
+        # Get the highest rId from the first presentation's relationship file
+        rels_path = "ppt/_rels/presentation.xml.rels"
+        rels_root = parse_xml(zip1.read(rels_path))
+
+        # Relationships are always direct children of the root
+        rel_ids = (_REL_ID_PATTERN.fullmatch(rel.get('Id', '')) for rel in rels_root)
+        max_rel_id = max((int(match.group(1)) for match in rel_ids if match), default=0)
+
+        # Process each slide in the second presentation
+        copied_slides = []  # Slide parts taken from the second presentation
+        slide_mapping = {}  # To keep track of new IDs for slides
+        rel_mapping = {}    # To keep track of new relationship IDs
+
+        # Parse the second presentation's relationships once and index them by Id
+        rel_root = parse_xml(zip2.read("ppt/_rels/presentation.xml.rels"))
+        rels_by_id = {rel.get('Id'): rel for rel in _ELEMENTS_WITH_ID(rel_root)}
+
+        for slide_id in slide_id_list2.iterfind('.//p:sldId', ns_dict):
+            old_id = slide_id.get('id')
+            old_rid = slide_id.get(f'{{{ns}}}id') if ns else slide_id.get('r:id')
+
+            # Generate new IDs
+            max_id += 1
+            max_rel_id += 1
+            new_id = str(max_id)
+            new_rid = f'rId{max_rel_id}'
+
+            slide_mapping[old_id] = new_id
+            rel_mapping[old_rid] = new_rid
+
+            # Find the slide path from relationships
+            rel = rels_by_id.get(old_rid)
+            slide_path = rel.get('Target') if rel is not None else None
+
+            if not slide_path:
+                continue
+
+            # Ensure we have the slide file name
+            slide_filename = posixpath.basename(slide_path)
+            old_slide_path = f"ppt/{slide_path}"
+
+            # Copy the slide file
+            parts[f"ppt/slides/{slide_filename}"] = (zip2, zip2.getinfo(old_slide_path))
+            copied_slides.append(old_slide_path)
+
+            # Copy slide relationships if they exist
+            old_slide_rels_file = posixpath.join(
+                posixpath.dirname(old_slide_path), "_rels", f"{slide_filename}.rels")
+
+            if has_member(zip2, old_slide_rels_file):
+                parts[f"ppt/slides/_rels/{slide_filename}.rels"] = (zip2, zip2.getinfo(old_slide_rels_file))
+
+            # Add to presentation.xml
+            new_slide_elem = ET.SubElement(slide_id_list1, f'{{{ns}}}sldId' if ns else 'p:sldId')
+            new_slide_elem.set('id', new_id)
+            new_slide_elem.set(f'{{{ns}}}id' if ns else 'r:id', new_rid)
+
+            # Add to presentation.xml.rels
+            new_rel_elem = ET.SubElement(rels_root, 'Relationship')
+            new_rel_elem.set('Id', new_rid)
+            new_rel_elem.set('Type', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide')
+            new_rel_elem.set('Target', f"slides/{slide_filename}")
+
+        # Copy chart data and other media the copied slides actually use,
+        # along with those parts' relationship files. Files overwrite the
+        # base's; other subfolders are only taken when the base has none of
+        # that name.
+        copied_folders = tuple(f"ppt/{folder}/" for folder in ['charts', 'media', 'embeddings', 'theme'])
+        reachable = reachable_parts(zip2, copied_slides, copied_folders)
+        base_dirs = {posixpath.dirname(name) for name in zip1.namelist()}
+        for info in zip2.infolist():
+            name = info.filename
+            if not name.startswith(copied_folders) or name.endswith('/'):
+                continue
+
+            if name not in reachable:
                 continue
-    
-    # Copy slides from the second presentation
-    slides_dir1 = os.path.join(base_dir, "ppt", "slides")
-    slides_dir2 = os.path.join(second_dir, "ppt", "slides")
-    
-    # Ensure the slides directory exists in the base
-    os.makedirs(slides_dir1, exist_ok=True)
-    
-    # Create _rels directory under slides if it doesn't exist
-    slides_rels_dir1 = os.path.join(slides_dir1, "_rels")
-    os.makedirs(slides_rels_dir1, exist_ok=True)
-    
-    # Process each slide in the second presentation
-    slide_mapping = {}  # To keep track of new IDs for slides
-    rel_mapping = {}    # To keep track of new relationship IDs
-    
-    for slide_id in slide_id_list2.findall('.//p:sldId', ns_dict):
-        old_id = slide_id.get('id')
-        old_rid = slide_id.get(f'{{{ns}}}id') if ns else slide_id.get('r:id')
-        
-        # Generate new IDs
-        max_id += 1
-        max_rel_id += 1
-        new_id = str(max_id)
-        new_rid = f'rId{max_rel_id}'
-        
-        slide_mapping[old_id] = new_id
-        rel_mapping[old_rid] = new_rid
-        
-        # Find the slide path from relationships
-        rel_file_path = os.path.join(second_dir, "ppt", "_rels", "presentation.xml.rels")
-        rel_tree = ET.parse(rel_file_path)
-        rel_root = rel_tree.getroot()
-        
-        slide_path = None
-        for rel in rel_root.findall(f".//*[@Id='{old_rid}']"):
-            slide_path = rel.get('Target')
-            break
-        
-        if not slide_path:
+
+            src_prefix = name[:name.index('/', len("ppt/")) + 1]
+            subdir = name[len(src_prefix):].partition('/')[0]
+            if subdir not in (name[len(src_prefix):], "_rels") and src_prefix + subdir in base_dirs:
+                continue
+            parts[name] = (zip2, info)
+
+        # Copy content types
+        content_types_path1 = "[Content_Types].xml"
+
+        ct_root1 = parse_xml(zip1.read(content_types_path1))
+        ct_root2 = parse_xml(zip2.read("[Content_Types].xml"))
+
+        # Add missing Override elements. Both documents are a flat list of
+        # Default/Override children, so only the top level is scanned.
+        existing_partnames = {child.get('PartName') for child in ct_root1}
+
+        # Collected first: extending moves the elements out of ct_root2
+        missing = []
+        for child in ct_root2:
+            partname = child.get('PartName')
+            if partname is not None and partname not in existing_partnames:
+                missing.append(child)
+        ct_root1.extend(missing)
+
+        # Save modified XML files
+        parts[pres1_xml_path] = serialize_xml(root1)
+        parts[rels_path] = serialize_xml(rels_root)
+        parts[content_types_path1] = serialize_xml(ct_root1)
+
+        # Create the new PPTX file
+        output_pptx = output_path if output_path.lower().endswith('.pptx') else output_path + '.pptx'
+        write_pptx(parts, output_pptx)
+
+    return output_pptx
+
+def reachable_parts(zip_ref, start_parts, folders):
+    """
+    Find the parts reachable through relationships from a set of parts.
+
+    Args:
+        zip_ref (ZipFile): Package holding the parts
+        start_parts (list): Part names the walk starts from
+        folders (tuple): Name prefixes the walk may enter
+
+    Returns:
+        set: Reachable part names within folders, plus their .rels parts
+    """
+    reachable = set()
+    pending = list(start_parts)
+    seen = set(pending)
+    while pending:
+        part_name = pending.pop()
+        part_dir, _, part_file = part_name.rpartition('/')
+        rels_name = f"{part_dir}/_rels/{part_file}.rels"
+        if not has_member(zip_ref, rels_name):
             continue
-        
-        # Ensure we have the slide file name
-        slide_filename = os.path.basename(slide_path)
-        old_slide_path = os.path.join(second_dir, "ppt", slide_path)
-        new_slide_path = os.path.join(slides_dir1, slide_filename)
-        
-        # Copy the slide file
-        shutil.copy2(old_slide_path, new_slide_path)
-        
-        # Copy slide relationships if they exist
-        old_slide_rels_dir = os.path.join(os.path.dirname(old_slide_path), "_rels")
-        old_slide_rels_file = os.path.join(old_slide_rels_dir, f"{slide_filename}.rels")
-        
-        if os.path.exists(old_slide_rels_file):
-            new_slide_rels_file = os.path.join(slides_rels_dir1, f"{slide_filename}.rels")
-            shutil.copy2(old_slide_rels_file, new_slide_rels_file)
-        
-        # Add to presentation.xml
-        new_slide_elem = ET.SubElement(slide_id_list1, f'{{{ns}}}sldId' if ns else 'p:sldId')
-        new_slide_elem.set('id', new_id)
-        new_slide_elem.set(f'{{{ns}}}id' if ns else 'r:id', new_rid)
-        
-        # Add to presentation.xml.rels
-        new_rel_elem = ET.SubElement(rels_root, 'Relationship')
-        new_rel_elem.set('Id', new_rid)
-        new_rel_elem.set('Type', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide')
-        new_rel_elem.set('Target', f"slides/{slide_filename}")
-    
-    # Copy chart data and other media if present
-    for folder in ['charts', 'media', 'embeddings', 'theme']:
-        src_folder = os.path.join(second_dir, "ppt", folder)
-        dst_folder = os.path.join(base_dir, "ppt", folder)
-        
-        if os.path.exists(src_folder):
-            os.makedirs(dst_folder, exist_ok=True)
-            
-            for item in os.listdir(src_folder):
-                src_item = os.path.join(src_folder, item)
-                dst_item = os.path.join(dst_folder, item)
-                
-                if os.path.isfile(src_item):
-                    shutil.copy2(src_item, dst_item)
-                elif os.path.isdir(src_item):
-                    if not os.path.exists(dst_item):
-                        shutil.copytree(src_item, dst_item)
-    
-    # Also copy chart relationship files
-    charts_rels_src = os.path.join(second_dir, "ppt", "charts", "_rels")
-    charts_rels_dst = os.path.join(base_dir, "ppt", "charts", "_rels")
-    
-    if os.path.exists(charts_rels_src):
-        os.makedirs(charts_rels_dst, exist_ok=True)
-        
-        for item in os.listdir(charts_rels_src):
-            src_item = os.path.join(charts_rels_src, item)
-            dst_item = os.path.join(charts_rels_dst, item)
-            
-            if os.path.isfile(src_item):
-                shutil.copy2(src_item, dst_item)
-    
-    # Copy content types
-    content_types_path1 = os.path.join(base_dir, "[Content_Types].xml")
-    content_types_path2 = os.path.join(second_dir, "[Content_Types].xml")
-    
-    ct_tree1 = ET.parse(content_types_path1)
-    ct_root1 = ct_tree1.getroot()
-    
-    ct_tree2 = ET.parse(content_types_path2)
-    ct_root2 = ct_tree2.getroot()
-    
-    # Add missing Override elements
-    existing_partnames = set()
-    for override in ct_root1.findall(".//*[@PartName]"):
-        existing_partnames.add(override.get('PartName'))
-    
-    for override in ct_root2.findall(".//*[@PartName]"):
-        partname = override.get('PartName')
-        if partname not in existing_partnames:
-            ct_root1.append(override)
-    
-    # Save modified XML files
-    tree1.write(pres1_xml_path, encoding='UTF-8', xml_declaration=True)
-    rels_tree.write(rels_path, encoding='UTF-8', xml_declaration=True)
-    ct_tree1.write(content_types_path1, encoding='UTF-8', xml_declaration=True)
-    
-    # Create the new PPTX file
-    shutil.make_archive(output_path, 'zip', base_dir)
-    
-    # Rename zip to pptx
-    if os.path.exists(output_path + '.pptx'):
-        os.remove(output_path + '.pptx')
-    os.rename(output_path + '.zip', output_path + '.pptx')
-    
-    # Clean up temp directory
-    shutil.rmtree(temp_dir)
-    
-    return output_path + '.pptx'
+        reachable.add(rels_name)
+
+        for rel in parse_xml(zip_ref.read(rels_name)):
+            target = rel.get('Target')
+            if not target or rel.get('TargetMode') == 'External':
+                continue
+            if target.startswith('/'):
+                target_name = target[1:]
+            else:
+                target_name = posixpath.normpath(posixpath.join(part_dir, target))
+            if target_name.startswith(folders) and target_name not in seen:
+                seen.add(target_name)
+                reachable.add(target_name)
+                pending.append(target_name)
+    return reachable
+
+def parse_xml(data):
+    """Parse an XML part held in memory."""
+    return ET.fromstring(data, _XML_PARSER)
+
+def serialize_xml(root):
+    """Serialize an XML part, with its declaration, for writing to the package."""
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+def has_member(zip_ref, name):
+    """Check whether a zip archive contains a member, without listing it."""
+    try:
+        zip_ref.getinfo(name)
+    except KeyError:
+        return False
+    return True
+
+def write_pptx(parts, output_pptx):
+    """Write the output entries to a .pptx file, replacing any existing one."""
+    # Many small header/XML writes: give them a 128 KiB buffer
+    with open(output_pptx, 'wb', buffering=_COPY_BUFFER_SIZE) as output_file:
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zip_ref:
+            for arcname, entry in parts.items():
+                if isinstance(entry, bytes):
+                    zip_ref.writestr(arcname, entry)
+                    continue
+
+                source_zip, info = entry
+                if info.compress_type in _RAW_COPY_METHODS and not info.flag_bits & 0x1:
+                    # Unchanged, unencrypted member: move its compressed bytes as-is
+                    copy_raw_member(zip_ref, source_zip, info, arcname)
+                    continue
+
+                # Otherwise stream it across instead of holding it all in memory
+                out_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+                out_info.file_size = info.file_size  # Lets zipfile decide on zip64
+                with source_zip.open(info) as src, zip_ref.open(out_info, 'w') as dst:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+
+def copy_file_range(src, dst, count):
+    """
+    Copy count bytes from src's current position to dst's, using
+    os.sendfile when both are real files so the data stays in the kernel.
+
+    Args:
+        src: Readable binary file object
+        dst: Writable binary file object
+        count (int): Number of bytes to copy
+    """
+    try:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        src_fd = dst_fd = None
+
+    if src_fd is not None and hasattr(os, 'sendfile'):
+        # Bypass the buffered layers: sendfile works on the raw descriptors
+        offset = src.tell()
+        dst.flush()
+        dst_pos = dst.tell()
+        copied = 0
+        try:
+            while copied < count:
+                sent = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+                if not sent:
+                    raise zipfile.BadZipFile("Unexpected end of data while copying member")
+                copied += sent
+        except OSError:
+            if copied:
+                raise
+            # Not supported for this pair of files; fall back to a buffered copy
+        else:
+            src.seek(offset + count)
+            dst.seek(dst_pos + count)
+            return
+
+    remaining = count
+    while remaining:
+        chunk = src.read(min(remaining, _COPY_BUFFER_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of data while copying member")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+def copy_raw_member(zip_out, source_zip, info, arcname):
+    """
+    Copy a member's compressed bytes into another archive, skipping the
+    inflate/deflate round trip.
+
+    Args:
+        zip_out (ZipFile): Archive being written
+        source_zip (ZipFile): Archive holding the member
+        info (ZipInfo): Member to copy
+        arcname (str): Name of the member in zip_out
+    """
+    out_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    out_info.compress_type = info.compress_type
+    out_info.CRC = info.CRC
+    out_info.compress_size = info.compress_size
+    out_info.file_size = info.file_size
+    out_info.external_attr = info.external_attr
+
+    with source_zip._lock, zip_out._lock:
+        source_fp = source_zip.fp
+        source_fp.seek(member_data_offset(source_zip, info))
+
+        start_member(zip_out, out_info)
+        copy_file_range(source_fp, zip_out.fp, info.compress_size)
+        finish_member(zip_out, out_info)
+
+def member_data_offset(source_zip, info):
+    """Offset of a member's (compressed) data in its archive file."""
+    # The local header's name/extra lengths can differ from the central directory's
+    source_zip.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, source_zip.fp.read(zipfile.sizeFileHeader))
+    return (info.header_offset + zipfile.sizeFileHeader
+            + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+def start_member(zip_out, out_info):
+    """Write the local header of a member whose sizes and CRC are already known."""
+    zip_out.fp.seek(zip_out.start_dir)
+    out_info.header_offset = zip_out.fp.tell()
+    zip_out.fp.write(out_info.FileHeader())
+
+def finish_member(zip_out, out_info):
+    """Register a member written with start_member in the central directory."""
+    zip_out.filelist.append(out_info)
+    zip_out.NameToInfo[out_info.filename] = out_info
+    zip_out.start_dir = zip_out.fp.tell()
+    zip_out._didModify = True
 
 # Example usage
 if __name__ == "__main__":
     merged_file = merge_pptx_files(
-        "presentation1.pptx", 
-        "presentation2.pptx", 
+        "presentation1.pptx",
+        "presentation2.pptx",
         "merged_presentation"
     )
     print(f"Created merged presentation: {merged_file}")
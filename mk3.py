@@ -1,253 +1,395 @@
-import zipfile
+import copy
+import mmap
 import os
+import zipfile
+import posixpath
 import shutil
-import xml.etree.ElementTree as ET
-from tempfile import mkdtemp
+import time
+from lxml import etree as ET
 import re
 import uuid
 
+# libxml2 parser shared by every parse; huge_tree lifts the depth/size limits
+# that large slide XML can hit
+_XML_PARSER = ET.XMLParser(remove_blank_text=False, huge_tree=True)
+
+# OOXML namespaces. p and r are registered once so that new elements get
+# their usual prefixes; content types and package relationships are the
+# default namespace of their parts and need no prefix (lxml rejects an
+# empty one anyway).
+_P_NS = 'http://schemas.openxmlformats.org/presentationml/2006/main'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_CT_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+_PR_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_NAMESPACES = {'p': _P_NS, 'r': _R_NS}
+ET.register_namespace('p', _P_NS)
+ET.register_namespace('r', _R_NS)
+
+_R_ID_ATTR = f'{{{_R_NS}}}id'
+_SLD_ID_TAG = f'{{{_P_NS}}}sldId'
+_OVERRIDE_TAG = f'{{{_CT_NS}}}Override'
+_RELATIONSHIP_TAG = f'{{{_PR_NS}}}Relationship'
+_SLIDE_REL_TYPE = f'{_R_NS}/slide'
+
+# Numbered relationship Id, e.g. rId12
+_REL_ID_PATTERN = re.compile(r'rId(\d+)')
+
+# ppt/ folders copied from the second presentation, in copy order
+_COPIED_FOLDERS = ('slides', 'slideMasters', 'slideLayouts', 'charts', 'media', 'embeddings', 'theme', 'diagrams')
+
+# Parts that are already compressed; deflating them again only costs time
+_STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.mp4', '.mp3', '.zip', '.xlsx')
+
+# Compiled once: [Content_Types].xml Override entries
+_ELEMENTS_WITH_PARTNAME = ET.XPath('//*[@PartName]')
+
+# Below this, mapping an input costs more than reading it
+_MMAP_MIN_SIZE = 1 << 20
+
+class _MappedFile(mmap.mmap):
+    """Read-only memory map that zipfile accepts as a file, which needs seekable()."""
+    
+    def seekable(self):
+        return True
+
 def merge_pptx_files(pptx1_path, pptx2_path, output_path):
     """
     Merge two PPTX files by working with their underlying XML structure.
     
+    Both packages are read straight from their zip archives; only the XML
+    parts that change are parsed and rewritten in memory.
+    
     Args:
         pptx1_path (str): Path to the first PPTX file
         pptx2_path (str): Path to the second PPTX file
         output_path (str): Path where the merged PPTX file will be saved
     """
-    # Create a temporary directory for our work
-    temp_dir = mkdtemp()
-    
-    # Extract the first PPTX (this will be our base)
-    base_dir = os.path.join(temp_dir, "base")
-    os.makedirs(base_dir)
-    
-    with zipfile.ZipFile(pptx1_path, 'r') as zip_ref:
-        zip_ref.extractall(base_dir)
-    
-    # Extract the second PPTX
-    second_dir = os.path.join(temp_dir, "second")
-    os.makedirs(second_dir)
-    
-    with zipfile.ZipFile(pptx2_path, 'r') as zip_ref:
-        zip_ref.extractall(second_dir)
-    
-    # Read presentation.xml files
-    pres1_xml_path = os.path.join(base_dir, "ppt", "presentation.xml")
-    pres2_xml_path = os.path.join(second_dir, "ppt", "presentation.xml")
-    
-    tree1 = ET.parse(pres1_xml_path)
-    root1 = tree1.getroot()
-    
-    tree2 = ET.parse(pres2_xml_path)
-    root2 = tree2.getroot()
-    
-    # Find namespace
-    ns_match = re.match(r'{(.*)}', root1.tag)
-    ns = ns_match.group(1) if ns_match else None
-    ns_dict = {'p': ns, 'r': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'} if ns else {}
-    
-    # Register namespaces for proper XML output
-    for prefix, uri in ns_dict.items():
-        ET.register_namespace(prefix, uri)
-    
-    # Register default namespace for OOXML content types
-    ET.register_namespace('', 'http://schemas.openxmlformats.org/package/2006/content-types')
-    
-    # Register relationships namespace
-    ET.register_namespace('r', 'http://schemas.openxmlformats.org/package/2006/relationships')
-    
-    # Find sldIdLst element (contains slide references)
-    slide_id_list1 = root1.find('.//p:sldIdLst', ns_dict)
-    slide_id_list2 = root2.find('.//p:sldIdLst', ns_dict)
-    
-    if slide_id_list1 is None or slide_id_list2 is None:
-        if slide_id_list1 is None:
-            print("Could not find slide ID list in first presentation")
-        if slide_id_list2 is None:
-            print("Could not find slide ID list in second presentation")
-        raise ValueError("Could not find slide ID list in one of the presentations")
-    
-    # Get the highest slide ID from the first presentation
-    max_id = 0
-    for slide in slide_id_list1.findall('./p:sldId', ns_dict):
-        id_val = int(slide.get('id', '0'))
-        max_id = max(max_id, id_val)
-    
-    # Get relationships from the first presentation
-    rels_path1 = os.path.join(base_dir, "ppt", "_rels", "presentation.xml.rels")
-    rels_tree1 = ET.parse(rels_path1)
-    rels_root1 = rels_tree1.getroot()
-    
-    # Get relationships from the second presentation
-    rels_path2 = os.path.join(second_dir, "ppt", "_rels", "presentation.xml.rels")
-    rels_tree2 = ET.parse(rels_path2)
-    rels_root2 = rels_tree2.getroot()
-    
-    # Find highest rId number in first presentation
-    max_rel_id = 0
-    for rel in rels_root1.findall('.//*[@Id]'):
-        rid = rel.get('Id', '')
-        if rid.startswith('rId'):
-            try:
-                rid_num = int(rid[3:])
-                max_rel_id = max(max_rel_id, rid_num)
-            except ValueError:
-                continue
-    
-    # Map of old rIds to new rIds for the second presentation
-    rid_mapping = {}
-    
-    # Step 1: Copy all slide content from second presentation
-    # This includes slides, slideMasters, slideLayouts, and their relationships
-    for folder_name in ['slides', 'slideMasters', 'slideLayouts', 'charts', 'media', 'embeddings', 'theme', 'diagrams']:
-        src_folder = os.path.join(second_dir, "ppt", folder_name)
-        dst_folder = os.path.join(base_dir, "ppt", folder_name)
+    with open_input(pptx1_path) as file1, open_input(pptx2_path) as file2, \
+            zipfile.ZipFile(file1, 'r') as zip1, zipfile.ZipFile(file2, 'r') as zip2:
+        # Read presentation.xml files
+        pres1_xml_path = "ppt/presentation.xml"
         
-        if os.path.exists(src_folder):
-            os.makedirs(dst_folder, exist_ok=True)
-            
-            # Copy files
-            for item in os.listdir(src_folder):
-                src_item = os.path.join(src_folder, item)
-                dst_item = os.path.join(dst_folder, item)
-                
-                # Skip _rels folders for now, we'll handle them separately
-                if item == "_rels":
-                    continue
-                
-                if os.path.isfile(src_item) and not os.path.exists(dst_item):
-                    shutil.copy2(src_item, dst_item)
-                elif os.path.isdir(src_item) and not os.path.exists(dst_item):
-                    shutil.copytree(src_item, dst_item)
-            
-            # Now handle relationship folders
-            src_rels = os.path.join(src_folder, "_rels")
-            dst_rels = os.path.join(dst_folder, "_rels")
-            
-            if os.path.exists(src_rels):
-                os.makedirs(dst_rels, exist_ok=True)
-                
-                for item in os.listdir(src_rels):
-                    src_item = os.path.join(src_rels, item)
-                    dst_item = os.path.join(dst_rels, item)
-                    
-                    if os.path.isfile(src_item) and not os.path.exists(dst_item):
-                        shutil.copy2(src_item, dst_item)
-    
-    # Step 2: Process content types to include all slide types
-    content_types_path1 = os.path.join(base_dir, "[Content_Types].xml")
-    content_types_path2 = os.path.join(second_dir, "[Content_Types].xml")
-    
-    ct_tree1 = ET.parse(content_types_path1)
-    ct_root1 = ct_tree1.getroot()
-    
-    ct_tree2 = ET.parse(content_types_path2)
-    ct_root2 = ct_tree2.getroot()
-    
-    # Add content types from second presentation
-    existing_partnames = set()
-    for override in ct_root1.findall(".//*[@PartName]"):
-        existing_partnames.add(override.get('PartName'))
-    
-    for override in ct_root2.findall(".//*[@PartName]"):
-        partname = override.get('PartName')
-        if partname not in existing_partnames:
-            ct_root1.append(override)
-    
-    # Step 3: Add slides from second presentation to first presentation
-    for slide_id in slide_id_list2.findall('./p:sldId', ns_dict):
-        old_id = slide_id.get('id')
-        r_id_attr = f'{{{ns_dict["r"]}}}id' if 'r' in ns_dict else 'r:id'
-        old_rid = slide_id.get(r_id_attr)
+        root1 = parse_xml(zip1.read(pres1_xml_path))
+        root2 = parse_xml(zip2.read("ppt/presentation.xml"))
         
-        # Generate new IDs
-        max_id += 1
-        max_rel_id += 1
-        new_id = str(max_id)
-        new_rid = f'rId{max_rel_id}'
+        # Find sldIdLst element (contains slide references)
+        slide_id_list1 = root1.find('.//p:sldIdLst', _NAMESPACES)
+        slide_id_list2 = root2.find('.//p:sldIdLst', _NAMESPACES)
         
-        # Store mapping
-        rid_mapping[old_rid] = new_rid
+        if slide_id_list1 is None or slide_id_list2 is None:
+            if slide_id_list1 is None:
+                print("Could not find slide ID list in first presentation")
+            if slide_id_list2 is None:
+                print("Could not find slide ID list in second presentation")
+            raise ValueError("Could not find slide ID list in one of the presentations")
         
-        # Find slide path from relationships
-        slide_target = None
-        for rel in rels_root2.findall(f".//*[@Id='{old_rid}']"):
-            slide_target = rel.get('Target')
-            break
+        # Nothing to merge: stop before any part is read or copied
+        slide_ids2 = slide_id_list2.findall('./p:sldId', _NAMESPACES)
+        if not slide_ids2:
+            raise ValueError("Second presentation has no slides to merge")
         
-        if not slide_target:
-            print(f"Could not find relationship for slide {old_id}")
-            continue
+        # Output entries, starting from the first PPTX (this will be our base).
+        # Members copied unchanged are held as (zip, info); rewritten ones as bytes.
+        parts = {info.filename: (zip1, info) for info in zip1.infolist()}
         
-        # Create new slide element in first presentation
-        new_slide_elem = ET.SubElement(slide_id_list1, f'{{{ns}}}sldId' if ns else 'p:sldId')
-        new_slide_elem.set('id', new_id)
-        new_slide_elem.set(r_id_attr, new_rid)
+        # Get the highest slide ID from the first presentation
+        max_id = 0
+        for slide in slide_id_list1.findall('./p:sldId', _NAMESPACES):
+            id_val = int(slide.get('id', '0'))
+            max_id = max(max_id, id_val)
         
-        # Add relationship to presentation.xml.rels
-        rel_elem = ET.SubElement(rels_root1, 'Relationship')
-        rel_elem.set('Id', new_rid)
-        rel_elem.set('Type', 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide')
-        rel_elem.set('Target', slide_target)
-    
-    # Step 4: Add all other relationships from second presentation to first
-    # (except slide relationships which we've already handled)
-    for rel in rels_root2.findall('.//*[@Id]'):
-        rid = rel.get('Id')
-        rel_type = rel.get('Type')
-        target = rel.get('Target')
+        # Get relationships from the first presentation
+        rels_path1 = "ppt/_rels/presentation.xml.rels"
+        rels_root1 = parse_xml(zip1.read(rels_path1))
+        
+        # Get relationships from the second presentation; only their
+        # attributes are needed, so they are streamed rather than kept as a tree
+        rels2 = read_relationships(zip2, "ppt/_rels/presentation.xml.rels")
+        rel_targets2 = {}
+        for rel in rels2:
+            rel_targets2.setdefault(rel.get('Id'), rel.get('Target'))
+        
+        # Find highest rId number in first presentation; relationships are
+        # always direct children of the root
+        rel_ids = (_REL_ID_PATTERN.fullmatch(rel.get('Id', '')) for rel in rels_root1)
+        max_rel_id = max((int(match.group(1)) for match in rel_ids if match), default=0)
+        
+        # Map of old rIds to new rIds for the second presentation
+        rid_mapping = {}
+        
+        # Step 1: Copy all slide content from second presentation
+        # This includes slides, slideMasters, slideLayouts, and their relationships.
+        # Files and _rels files the base already has are kept; so are its
+        # subfolders, which are only taken from the second deck as a whole.
+        base_dirs = set()
+        for name in parts:
+            # Once a directory is known, so are all of its parents
+            end = name.rfind('/')
+            while end > 0 and name[:end] not in base_dirs:
+                base_dirs.add(name[:end])
+                end = name.rfind('/', 0, end)
+        
+        # One pass over the second deck's directory, bucketing members by
+        # folder; they are then copied folder by folder as before
+        members_by_folder = {folder_name: [] for folder_name in _COPIED_FOLDERS}
+        for info in zip2.infolist():
+            name = info.filename
+            if not name.startswith('ppt/') or name.endswith('/'):
+                continue
+            folder_name, _, member = name[4:].partition('/')
+            if member and folder_name in members_by_folder:
+                members_by_folder[folder_name].append((info, member))
+        
+        for folder_name, members in members_by_folder.items():
+            src_prefix = f"ppt/{folder_name}/"
+            
+            for info, member in members:
+                name = info.filename
+                item, _, rest = member.partition('/')
+                if not rest or (item == "_rels" and '/' not in rest):
+                    # A file directly in the folder or in its _rels folder
+                    if name not in parts:
+                        parts[name] = (zip2, info)
+                elif item != "_rels" and src_prefix + item not in base_dirs:
+                    parts[name] = (zip2, info)
+        
+        # Step 2: Process content types to include all slide types
+        content_types_path1 = "[Content_Types].xml"
         
-        # Skip slide relationships (already handled)
-        if rel_type == 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide':
-            continue
+        ct_root1 = parse_xml(zip1.read(content_types_path1))
         
-        # Check if this relationship target already exists
-        target_exists = False
-        for existing_rel in rels_root1.findall('.//*[@Target]'):
-            if existing_rel.get('Target') == target and existing_rel.get('Type') == rel_type:
-                target_exists = True
-                break
+        # Add content types from second presentation
+        existing_partnames = set()
+        for override in _ELEMENTS_WITH_PARTNAME(ct_root1):
+            existing_partnames.add(override.get('PartName'))
         
-        if not target_exists:
+        # Stream the second deck's overrides instead of building its tree,
+        # dropping each element once it has been looked at
+        with zip2.open("[Content_Types].xml") as ct_file2:
+            for _, override in ET.iterparse(ct_file2, events=('end',), tag=_OVERRIDE_TAG, huge_tree=True):
+                partname = override.get('PartName')
+                if partname not in existing_partnames:
+                    existing_partnames.add(partname)
+                    ct_root1.append(copy.copy(override))
+                override.clear()
+                while override.getprevious() is not None:
+                    del override.getparent()[0]
+        
+        # Step 3: Add slides from second presentation to first presentation
+        new_slide_elems = []
+        new_rels = []
+        for slide_id in slide_ids2:
+            old_id = slide_id.get('id')
+            old_rid = slide_id.get(_R_ID_ATTR)
+            
+            # Generate new IDs
+            max_id += 1
             max_rel_id += 1
+            new_id = str(max_id)
             new_rid = f'rId{max_rel_id}'
-            rid_mapping[rid] = new_rid
             
-            # Add new relationship
-            new_rel = ET.SubElement(rels_root1, 'Relationship')
-            new_rel.set('Id', new_rid)
-            new_rel.set('Type', rel_type)
-            new_rel.set('Target', target)
+            # Store mapping
+            rid_mapping[old_rid] = new_rid
+            
+            # Find slide path from relationships
+            slide_target = rel_targets2.get(old_rid)
+            
+            if not slide_target:
+                print(f"Could not find relationship for slide {old_id}")
+                continue
+            
+            # A slide whose name the base already uses is renamed on the way in
+            slide_target = copy_renamed_slide(zip2, parts, ct_root1, slide_target)
+            
+            # Create new slide element in first presentation
+            new_slide_elems.append(ET.Element(_SLD_ID_TAG, {'id': new_id, _R_ID_ATTR: new_rid}))
+            
+            # Add relationship to presentation.xml.rels
+            new_rels.append(ET.Element('Relationship', {'Id': new_rid, 'Type': _SLIDE_REL_TYPE, 'Target': slide_target}))
+        
+        # Insert the new entries in one go rather than one at a time
+        slide_id_list1.extend(new_slide_elems)
+        rels_root1.extend(new_rels)
+        
+        # Step 4: Add all other relationships from second presentation to first
+        # (except slide relationships which we've already handled)
+        existing_targets = {(rel.get('Target'), rel.get('Type')) for rel in rels_root1}
+        new_rels = []
+        for rel in rels2:
+            rid = rel.get('Id')
+            rel_type = rel.get('Type')
+            target = rel.get('Target')
+            
+            # Skip slide relationships (already handled)
+            if rel_type == _SLIDE_REL_TYPE:
+                continue
             
-            # If this is an external relationship (target with http://)
-            if rel.get('TargetMode') == 'External':
-                new_rel.set('TargetMode', 'External')
+            # Check if this relationship target already exists
+            if (target, rel_type) not in existing_targets:
+                existing_targets.add((target, rel_type))
+                max_rel_id += 1
+                new_rid = f'rId{max_rel_id}'
+                rid_mapping[rid] = new_rid
+                
+                # Add new relationship
+                new_rel = ET.Element('Relationship', {'Id': new_rid, 'Type': rel_type, 'Target': target})
+                
+                # If this is an external relationship (target with http://)
+                if rel.get('TargetMode') == 'External':
+                    new_rel.set('TargetMode', 'External')
+                new_rels.append(new_rel)
+        rels_root1.extend(new_rels)
+        
+        # Save modified XML files
+        parts[pres1_xml_path] = serialize_xml(root1)
+        parts[rels_path1] = serialize_xml(rels_root1)
+        parts[content_types_path1] = serialize_xml(ct_root1)
+        
+        # Create new PPTX file
+        output_pptx = output_path
+        if not output_pptx.endswith('.pptx'):
+            output_pptx += '.pptx'
+        
+        write_pptx(parts, output_pptx, zip1)
     
-    # Save modified XML files
-    tree1.write(pres1_xml_path, encoding='UTF-8', xml_declaration=True)
-    rels_tree1.write(rels_path1, encoding='UTF-8', xml_declaration=True)
-    ct_tree1.write(content_types_path1, encoding='UTF-8', xml_declaration=True)
+    return output_pptx
+
+def copy_renamed_slide(zip2, parts, ct_root, slide_target):
+    """
+    Make sure a slide from the second presentation is in the output under a
+    name of its own, renaming it if the base already uses its name.
     
-    # Create new PPTX file
-    output_pptx = output_path
-    if not output_pptx.endswith('.pptx'):
-        output_pptx += '.pptx'
+    Args:
+        zip2 (ZipFile): Second presentation
+        parts (dict): Output entries
+        ct_root: Root of the output [Content_Types].xml
+        slide_target (str): Slide target relative to ppt/
     
-    if os.path.exists(output_pptx):
-        os.remove(output_pptx)
+    Returns:
+        str: Target of the slide in the output, relative to ppt/
+    """
+    source_name = f"ppt/{slide_target}"
+    entry = parts.get(source_name)
+    if not has_member(zip2, source_name) or (entry is not None and entry[0] is zip2):
+        # Missing from the second deck, or copied as-is in step 1
+        return slide_target
+    
+    slide_dir, _, slide_file = source_name.rpartition('/')
+    stem, ext = posixpath.splitext(slide_file)
+    stem = stem.rstrip('0123456789')
+    index = 1
+    while f"{slide_dir}/{stem}{index}{ext}" in parts:
+        index += 1
+    new_file = f"{stem}{index}{ext}"
+    
+    parts[f"{slide_dir}/{new_file}"] = (zip2, zip2.getinfo(source_name))
+    rels_name = f"{slide_dir}/_rels/{slide_file}.rels"
+    if has_member(zip2, rels_name):
+        parts[f"{slide_dir}/_rels/{new_file}.rels"] = (zip2, zip2.getinfo(rels_name))
+    
+    override = ET.SubElement(ct_root, _OVERRIDE_TAG)
+    override.set('PartName', f"/{slide_dir}/{new_file}")
+    override.set('ContentType', 'application/vnd.openxmlformats-officedocument.presentationml.slide+xml')
+    
+    return posixpath.join(posixpath.dirname(slide_target), new_file)
+
+def open_input(path):
+    """
+    Open a presentation for reading, memory-mapped if it is large.
     
-    # Create the PPTX file (zip the directory)
-    with zipfile.ZipFile(output_pptx, 'w') as zipf:
-        for root, dirs, files in os.walk(base_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                zipf.write(file_path, os.path.relpath(file_path, base_dir))
+    Member reads then come straight from the page cache instead of through
+    read() calls on a buffered file.
     
-    # Clean up temp directory
-    shutil.rmtree(temp_dir)
+    Args:
+        path (str): Path of the PPTX file
     
-    return output_pptx
+    Returns:
+        File object to hand to zipfile.ZipFile
+    """
+    input_file = open(path, 'rb')
+    if os.fstat(input_file.fileno()).st_size < _MMAP_MIN_SIZE:
+        return input_file
+    with input_file:
+        return _MappedFile(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def read_relationships(zip_ref, name):
+    """
+    Stream a .rels part and return the attributes of each Relationship.
+    
+    Each element is dropped as soon as its attributes have been read, so
+    the part's tree is never held in memory.
+    
+    Args:
+        zip_ref (ZipFile): Archive holding the part
+        name (str): Member name of the .rels part
+    
+    Returns:
+        list: One attribute dict per Relationship, in document order
+    """
+    relationships = []
+    with zip_ref.open(name) as rels_file:
+        for _, rel in ET.iterparse(rels_file, events=('end',), tag=_RELATIONSHIP_TAG, huge_tree=True):
+            relationships.append(dict(rel.attrib))
+            rel.clear()
+            while rel.getprevious() is not None:
+                del rel.getparent()[0]
+    return relationships
+
+def parse_xml(data):
+    """Parse an XML part held in memory."""
+    return ET.fromstring(data, _XML_PARSER)
+
+def serialize_xml(root):
+    """Serialize an XML part, with its declaration, for writing to the package."""
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True, standalone=True)
+
+def has_member(zip_ref, name):
+    """Check whether a zip archive contains a member, without listing it."""
+    try:
+        zip_ref.getinfo(name)
+    except KeyError:
+        return False
+    return True
+
+def write_pptx(parts, output_pptx, base_zip):
+    """
+    Write the output entries to a .pptx file, replacing any existing one.
+    
+    Already-compressed media is stored rather than deflated again, and XML
+    parts are deflated at level 9. Each entry keeps the date and attributes
+    of the member it came from; rewritten parts take those of the base
+    presentation's member of the same name.
+    
+    Args:
+        parts (dict): Output entries, (zip, info) or bytes
+        output_pptx (str): Path of the .pptx file to write
+        base_zip (ZipFile): Base presentation the rewritten parts came from
+    """
+    with zipfile.ZipFile(output_pptx, 'w', zipfile.ZIP_DEFLATED, compresslevel=6, allowZip64=True) as zipf:
+        for arcname, entry in parts.items():
+            if isinstance(entry, bytes):
+                source_info = base_zip.NameToInfo.get(arcname)
+            else:
+                source_zip, source_info = entry
+            
+            out_info = zipfile.ZipInfo(arcname, date_time=source_info.date_time if source_info else time.localtime()[:6])
+            out_info.external_attr = source_info.external_attr if source_info else 0o600 << 16
+            if arcname.lower().endswith(_STORED_EXTENSIONS):
+                out_info.compress_type = zipfile.ZIP_STORED
+            else:
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+                if arcname.endswith(('.xml', '.rels')):
+                    # No public per-entry level before Python 3.13
+                    out_info._compresslevel = 9
+            
+            if isinstance(entry, bytes):
+                zipf.writestr(out_info, entry)
+                continue
+            
+            # Stream the member across in 1 MiB chunks instead of reading it whole
+            out_info.file_size = source_info.file_size  # Lets zipfile decide on zip64
+            with source_zip.open(source_info) as src, zipf.open(out_info, 'w') as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
 
 # Example usage
 if __name__ == "__main__":
@@ -6,11 +6,15 @@ This script runs on Unix and handles various PowerPoint elements including chart
 Usage: python ppt_merger.py <input_ppt1> <input_ppt2> <output_ppt>
 """
 
+import io
 import os
+import re
 import sys
 import copy
 from pptx import Presentation
+from pptx.oxml.ns import qn
 from pptx.enum.shapes import MSO_SHAPE_TYPE
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
 import argparse
 import logging
 
@@ -18,6 +22,23 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Clark-notation prefix of r:id, r:embed, r:link and friends
+_R_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+# Run font properties copied as-is by copy_text_frame()
+_FONT_ATTRS = ('bold', 'italic', 'underline', 'size')
+
+# Relationships into a deck's structure, which copied slide content doesn't
+# keep: the copy has its own layout, notes aren't copied, and a link to
+# another slide (a click action) can't follow it into the merged deck
+_UNCOPIED_RELTYPES = frozenset((RT.SLIDE, RT.SLIDE_LAYOUT, RT.SLIDE_MASTER, RT.NOTES_SLIDE))
+
+# Hyperlinks, which are dropped along with a dropped relationship
+_HLINK_TAGS = frozenset((qn('a:hlinkClick'), qn('a:hlinkHover')))
+
+# Trailing index and extension of a partname, e.g. "3.xml" in /ppt/charts/chart3.xml
+_PARTNAME_INDEX_RE = re.compile(r'\d*(\.\w+)$')
+
 def validate_files(input_files, output_file):
     """Validate input and output files."""
     # Check if input files exist
@@ -53,33 +74,138 @@ def copy_slide_layouts(source_pres, target_pres):
 def copy_slide(source_slide, target_pres, source_layouts, target_layouts):
     """Copy a slide from source presentation to target presentation."""
     # Find the closest matching layout
-    if source_slide.slide_layout.name in target_layouts:
-        target_layout = target_layouts[source_slide.slide_layout.name]
-    else:
+    layout_name = source_slide.slide_layout.name
+    target_layout = target_layouts.get(layout_name)
+    if target_layout is None:
         # Fallback to a default layout if the exact match is not found
-        logger.warning(f"Layout '{source_slide.slide_layout.name}' not found in target. Using default.")
+        logger.warning(f"Layout '{layout_name}' not found in target. Using default.")
         target_layout = target_pres.slide_layouts[0]
     
     # Create a new slide with the matched layout
     target_slide = target_pres.slides.add_slide(target_layout)
     
-    # Copy slide properties
-    if hasattr(source_slide, 'background'):
-        if hasattr(target_slide, 'background'):
-            try:
-                target_slide.background = copy.deepcopy(source_slide.background)
-            except Exception as e:
-                logger.warning(f"Could not copy slide background: {e}")
+    # Copy the shape tree as XML: a deep copy keeps all formatting, and the
+    # parts it refers to (images, charts, media) are related to the new slide
+    rId_map = copy_slide_rels(source_slide.part, target_slide.part)
+    
+    # Copy slide properties: the background is swapped in as the <p:bg>
+    # element, which a picture fill refers to by rId like any shape
+    source_bg = source_slide._element.cSld.bg
+    if source_bg is not None:
+        try:
+            target_cSld = target_slide._element.cSld
+            target_cSld._remove_bg()
+            target_bg = copy.deepcopy(source_bg)
+            remap_rids(target_bg, rId_map)
+            target_cSld.insert(0, target_bg)
+        except Exception as e:
+            logger.warning(f"Could not copy slide background: {e}")
+    target_tree = target_slide.shapes._spTree
+    
+    # The source's placeholders replace the empty ones the layout added
+    for placeholder in list(target_slide.placeholders):
+        target_tree.remove(placeholder._element)
     
-    # Copy shapes from source to target
     for shape in source_slide.shapes:
         try:
-            copy_shape(shape, target_slide)
+            element = copy.deepcopy(shape._element)
+            remap_rids(element, rId_map)
+            target_tree.insert_element_before(element, 'p:extLst')
         except Exception as e:
-            logger.warning(f"Error copying shape: {e}")
+            # Fall back to rebuilding the shape through python-pptx
+            logger.warning(f"Could not copy shape XML, rebuilding it: {e}")
+            try:
+                copy_shape(shape, target_slide)
+            except Exception as e:
+                logger.warning(f"Error copying shape: {e}")
     
     return target_slide
 
+def copy_slide_rels(source_part, target_part):
+    """
+    Relate the parts a slide refers to to its copy.
+    
+    Images go through the target package's image dedupe; other parts are
+    copied under fresh names together with their own relationships.
+    
+    Returns:
+        dict: Source rId -> rId of the same target on the copy, or '' for
+        relationships that were dropped
+    """
+    rId_map = {}
+    clones = {}
+    for rel in source_part.rels.values():
+        if rel.reltype == RT.IMAGE and not rel.is_external:
+            _, rId_map[rel.rId] = target_part.get_or_add_image_part(io.BytesIO(rel.target_part.blob))
+        else:
+            rId_map[rel.rId] = copy_rel(rel, target_part, clones)
+    return rId_map
+
+def copy_rel(rel, new_part, clones):
+    """
+    Recreate a relationship of a copied part on new_part, cloning its target.
+    
+    Args:
+        rel: The source relationship
+        new_part: The copy to relate from
+        clones (dict): id() of each source part already cloned -> its clone,
+            shared by every part copied for one slide
+    
+    Returns:
+        str: The new rId, or '' if the relationship was dropped
+    """
+    if rel.is_external:
+        return new_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+    if rel.reltype in _UNCOPIED_RELTYPES:
+        return ''
+    
+    # Parts reached more than once (video and media rels sharing one part,
+    # or a cycle between parts) are copied once
+    new_target = clones.get(id(rel.target_part))
+    if new_target is not None:
+        return new_part.relate_to(new_target, rel.reltype)
+    
+    new_target = clone_part(rel.target_part, new_part.package)
+    clones[id(rel.target_part)] = new_target
+    rId = new_part.relate_to(new_target, rel.reltype)
+    copy_part_rels(rel.target_part, new_target, clones)
+    return rId
+
+def clone_part(part, package):
+    """
+    Create a copy of part under a fresh partname in package.
+    
+    The copy has no relationships yet. Relate it to its parent before cloning
+    further parts, since next_partname() only sees parts reachable from the
+    package root.
+    """
+    partname_template = _PARTNAME_INDEX_RE.sub(r'%d\1', part.partname)
+    partname = package.next_partname(partname_template)
+    return type(part).load(partname, part.content_type, package, part.blob)
+
+def copy_part_rels(source_part, new_part, clones):
+    """Recreate source_part's relationships on its copy, cloning target parts."""
+    rId_map = {rel.rId: copy_rel(rel, new_part, clones) for rel in source_part.rels.values()}
+    
+    # XML parts refer to their relationships by rId; point those at the new ids
+    element = getattr(new_part, '_element', None)
+    if element is not None:
+        remap_rids(element, rId_map)
+
+def remap_rids(element, rId_map):
+    """Point the r:id-style attributes in element and its descendants at new rIds."""
+    dropped_links = []
+    for el in element.iter():
+        for attr, value in el.attrib.items():
+            if attr.startswith(_R_NS) and value in rId_map:
+                el.set(attr, rId_map[value])
+                if not rId_map[value] and el.tag in _HLINK_TAGS:
+                    dropped_links.append(el)
+    
+    # A hyperlink whose target was dropped would point nowhere
+    for el in dropped_links:
+        el.getparent().remove(el)
+
 def copy_shape(shape, target_slide):
     """Copy a shape from source slide to target slide."""
     # Handle different shape types
@@ -116,15 +242,16 @@ def copy_text_frame(source_frame, target_frame):
     if not hasattr(source_frame, 'paragraphs'):
         return
     
-    # Clear existing paragraphs in target
-    while len(target_frame.paragraphs) > 1:
-        p = target_frame.paragraphs[-1]
-        p._p.getparent().remove(p._p)
+    # Clear existing paragraphs in target, all but the first in one pass
+    tx_body = target_frame._txBody
+    for p in tx_body.p_lst[1:]:
+        tx_body.remove(p)
+    first_para = target_frame.paragraphs[0] if tx_body.p_lst else None
     
     # Copy each paragraph
     for i, source_para in enumerate(source_frame.paragraphs):
-        if i == 0 and len(target_frame.paragraphs) > 0:
-            target_para = target_frame.paragraphs[0]
+        if i == 0 and first_para is not None:
+            target_para = first_para
         else:
             target_para = target_frame.add_paragraph()
         
@@ -132,34 +259,35 @@ def copy_text_frame(source_frame, target_frame):
         target_para.text = source_para.text
         
         # Copy paragraph formatting
-        if hasattr(source_para, 'alignment') and source_para.alignment:
+        if source_para.alignment:
             target_para.alignment = source_para.alignment
         
-        if hasattr(source_para, 'level') and source_para.level:
+        if source_para.level:
             target_para.level = source_para.level
         
         # Copy runs (text formatting)
-        if hasattr(source_para, 'runs'):
-            for j, source_run in enumerate(source_para.runs):
-                if j == 0 and len(target_para.runs) > 0:
-                    target_run = target_para.runs[0]
-                else:
-                    target_run = target_para.add_run()
-                
-                target_run.text = source_run.text
-                
-                # Copy run formatting
-                if hasattr(source_run, 'font') and hasattr(target_run, 'font'):
-                    if hasattr(source_run.font, 'bold'):
-                        target_run.font.bold = source_run.font.bold
-                    if hasattr(source_run.font, 'italic'):
-                        target_run.font.italic = source_run.font.italic
-                    if hasattr(source_run.font, 'underline'):
-                        target_run.font.underline = source_run.font.underline
-                    if hasattr(source_run.font, 'size'):
-                        target_run.font.size = source_run.font.size
-                    if hasattr(source_run.font, 'color'):
-                        target_run.font.color.rgb = source_run.font.color.rgb
+        target_runs = target_para.runs
+        for j, source_run in enumerate(source_para.runs):
+            if j == 0 and target_runs:
+                target_run = target_runs[0]
+            else:
+                target_run = target_para.add_run()
+            
+            target_run.text = source_run.text
+            
+            # Copy run formatting
+            source_font = source_run.font
+            target_font = target_run.font
+            for attr in _FONT_ATTRS:
+                setattr(target_font, attr, getattr(source_font, attr))
+            
+            # Theme and preset colors have no .rgb; unset ones give None
+            try:
+                rgb = source_font.color.rgb
+            except AttributeError:
+                rgb = None
+            if rgb is not None:
+                target_font.color.rgb = rgb
 
 def copy_chart(shape, target_slide):
     """Copy a chart shape."""
@@ -251,7 +379,11 @@ def merge_presentations(input_files, output_file):
         # Copy slide layouts if needed
         source_layouts, target_layouts = copy_slide_layouts(source_pres, merged_pres)
         
-        # Copy each slide
+        # Copy each slide. This stays serial: every copy adds parts and
+        # relationships to merged_pres's one package, so a worker process
+        # could only hand back shape XML. The deck still has to be loaded here
+        # for its rels and parts, and parsing that XML is slower than the
+        # deepcopy it would replace.
         for j, slide in enumerate(source_pres.slides):
             logger.info(f"  Copying slide {j+1}")
             copy_slide(slide, merged_pres, source_layouts, target_layouts)
@@ -1,39 +1,351 @@
 import threading
-import pickle
 import os
-import time
+import struct
+import sys
 import atexit
+import gc
+import glob
+import mmap
+import queue
+from types import MappingProxyType
 from typing import Any, Dict, Optional, Iterable, Set
 
+try:
+    import msgspec
+except ImportError:  # Without msgspec, state is persisted with pickle
+    msgspec = None
+
+# pickle itself is imported where it is used, as few processes ever need
+# it; its exceptions come from the C accelerator, which is cheap to import
+try:
+    from _pickle import PickleError
+except ImportError:
+    from pickle import PickleError
+
+if msgspec is not None:
+    # Built once and reused: msgspec sets up its type tables per instance
+    _encoder = msgspec.msgpack.Encoder()
+    _decoder = msgspec.msgpack.Decoder()  # Log records
+    _state_decoder = msgspec.msgpack.Decoder(dict)  # Whole-state snapshots
+    _DECODE_ERRORS = (msgspec.DecodeError, PickleError, EOFError, IOError,
+                      ImportError, AttributeError)  # Pickled class that can't be found
+    _ENCODE_ERRORS = (msgspec.EncodeError, PickleError, TypeError, IOError)
+else:
+    _DECODE_ERRORS = (PickleError, EOFError, IOError, ImportError, AttributeError)
+    _ENCODE_ERRORS = (PickleError, TypeError, IOError)
+
+# Sentinel telling a missing key apart from a stored None
+_MISSING = object()
+
+# CPython runs a single dict lookup atomically (under the GIL, or the dict's
+# own lock on free-threaded builds), so single-key reads can skip the locks
+_ATOMIC_DICT_READS = sys.implementation.name == 'cpython'
+
+# Below this, mapping the state file costs more than reading it
+_MMAP_MIN_SIZE = 1 << 20
+
+# Types msgpack brings back as the same type. Anything else (tuples and
+# sets, which come back as lists, subclasses, bytearrays, ...) is pickled
+_MSGPACK_SCALARS = frozenset({str, int, float, bool, type(None), bytes})
+_MSGPACK_TYPES = _MSGPACK_SCALARS | {list, dict}
+
+# Length prefix of each write-ahead log frame
+_WAL_FRAME_HEADER = struct.Struct('>I')
+
+# Start of a snapshot pickled with out-of-band buffers, which neither a
+# pickle nor a msgpack snapshot can begin with. It is followed by the
+# buffer count, the length of the pickle and of each buffer, the pickle,
+# then the buffers.
+_OOB_MAGIC = b'SMOOB'
+_OOB_COUNT = struct.Struct('>I')
+_OOB_LENGTH = struct.Struct('>Q')
+
+
+def _round_trips_msgpack(values: Iterable) -> bool:
+    """Whether msgpack would bring every one of values back with its own type."""
+    # Checked a container at a time, so flat ones are a single C-level pass
+    pending = [values]
+    while pending:
+        values = pending.pop()
+        kinds = set(map(type, values))
+        if kinds <= _MSGPACK_SCALARS:
+            continue
+        if not kinds <= _MSGPACK_TYPES:
+            return False
+        for value in values:
+            kind = type(value)
+            if kind is list:
+                pending.append(value)
+            elif kind is dict:
+                if not set(map(type, value)) <= _MSGPACK_SCALARS:
+                    return False  # Keys msgpack would turn into tuples
+                pending.append(value.values())
+    return True
+
+
+def _encode_state(record: tuple) -> bytes:
+    """
+    Serialize a log record for writing to disk: msgpack when it brings the
+    record's values back as they were, pickle otherwise. _decode_state
+    reads either.
+    """
+    if msgspec is not None and _round_trips_msgpack(record[1:]):
+        try:
+            return _encoder.encode(record)
+        except (msgspec.EncodeError, TypeError):
+            pass  # Out of msgpack's range, like ints over 64 bits
+    import pickle
+    return pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _encode_snapshot(state: Dict[str, Any]) -> list:
+    """
+    Serialize a whole-state snapshot as chunks to be written out in order.
+    
+    A snapshot holding values msgpack can't represent, or would bring back
+    as another type (tuples, sets, numpy arrays, ...), falls back to pickle.
+    Pickle protocol 5 lets values such as numpy arrays pass their data out
+    of band, so it is written straight from the values' own memory rather
+    than copied into the pickle first.
+    """
+    if msgspec is not None and _round_trips_msgpack((state,)):
+        try:
+            return [_encoder.encode(state)]
+        except (msgspec.EncodeError, TypeError):
+            pass  # Pickle it instead
+    
+    import pickle
+    buffers = []
+    data = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+    if not buffers:
+        return [data]
+    raws = [buffer.raw() for buffer in buffers]
+    header = [_OOB_MAGIC, _OOB_COUNT.pack(len(raws)), _OOB_LENGTH.pack(len(data))]
+    header.extend(_OOB_LENGTH.pack(raw.nbytes) for raw in raws)
+    return [b''.join(header), data, *raws]
+
+
+def _decode_oob_snapshot(data) -> Any:
+    """Unpickle a snapshot written with out-of-band buffers, without copying them."""
+    view = memoryview(data)
+    offset = len(_OOB_MAGIC)
+    (count,) = _OOB_COUNT.unpack_from(view, offset)
+    offset += _OOB_COUNT.size
+    lengths = [length for (length,) in _OOB_LENGTH.iter_unpack(
+        view[offset:offset + (count + 1) * _OOB_LENGTH.size])]
+    offset += (count + 1) * _OOB_LENGTH.size
+    if len(lengths) != count + 1 or offset + sum(lengths) > len(view):
+        raise EOFError("State file is truncated")
+    
+    chunks = []
+    for length in lengths:
+        chunks.append(view[offset:offset + length])
+        offset += length
+    import pickle
+    return pickle.loads(chunks[0], buffers=chunks[1:])
+
+
+def _decode_state(data, snapshot: bool = False) -> Any:
+    """
+    Deserialize persisted state, falling back to pickle for legacy files.
+    
+    Args:
+        data: The encoded bytes, or any buffer holding them
+        snapshot: Whether data is a whole-state snapshot, which decodes
+            straight to a dict
+    """
+    if snapshot and data[:len(_OOB_MAGIC)] == _OOB_MAGIC:
+        return _decode_oob_snapshot(data)
+    if msgspec is not None:
+        try:
+            return (_state_decoder if snapshot else _decoder).decode(data)
+        except msgspec.DecodeError:
+            pass  # Not msgpack: state saved by an earlier version
+    import pickle
+    return pickle.loads(data)
+
+
+class _ReadWriteLock:
+    """
+    A reader-writer lock: any number of readers can hold it together, while
+    a writer holds it alone. Writers waiting for the lock go ahead of new
+    readers, so a steady stream of reads can't starve them.
+    
+    Used directly as a context manager it takes the write side, so existing
+    `with state._lock:` blocks stay atomic. The writing thread may re-enter
+    it, as a writer or through `reader`.
+    """
+    
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None  # Ident of the thread holding the write side
+        self._write_depth = 0
+        self._waiting_writers = 0
+        self.reader = _ReadLock(self)
+    
+    def acquire_read(self):
+        """Acquire the read side, waiting while a writer holds or wants the lock."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1  # Nested in our own write
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+    
+    def release_read(self):
+        """Release the read side."""
+        with self._cond:
+            if self._writer == threading.get_ident():
+                self._write_depth -= 1
+                return
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+    
+    def acquire(self):
+        """Acquire the write side, waiting until no reader or other writer holds it."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return True
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+        return True
+    
+    def release(self):
+        """Release the write side."""
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+    
+    def __enter__(self):
+        return self.acquire()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class _ReadLock:
+    """Context manager for the read side of a _ReadWriteLock."""
+    
+    def __init__(self, rwlock: _ReadWriteLock):
+        self._rwlock = rwlock
+    
+    def __enter__(self):
+        self._rwlock.acquire_read()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._rwlock.release_read()
+
+
+class _StripesLock:
+    """
+    Context manager holding the read side of a _ReadWriteLock plus every
+    stripe lock, taken in index order, for a consistent view of all stripes.
+    """
+    
+    def __init__(self, rwlock: _ReadWriteLock, stripe_locks):
+        self._rwlock = rwlock
+        self._stripe_locks = stripe_locks
+    
+    def __enter__(self):
+        self._rwlock.acquire_read()
+        for lock in self._stripe_locks:
+            lock.acquire()
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        for lock in reversed(self._stripe_locks):
+            lock.release()
+        self._rwlock.release_read()
+
 
 class StateManager:
     """
     A thread-safe state manager for Python applications, inspired by Streamlit's session state.
     Allows storing and accessing persistent variables across different scripts and handles concurrency.
+    
+    On CPython, single-key reads (`state['key']`, get, `in`) take no lock;
+    they see each write as a whole, but not the end of a `with state._lock:`
+    block that is still running.
     """
+    __slots__ = (
+        '_stripes', '_stripe_locks', '_stripe_mask', '_all_stripes_lock',
+        '_snapshot', '_dirty', '_wal', '_wal_lock', '_wal_incomplete', '_wal_seq',
+        '_write_queue', '_writer_thread', '_wakeup', '_stopping', '_persist_lock', '_persist_seq',
+        '_persist_file', '_auto_persist', '_persist_interval', '_persistence_thread',
+        '_cleanup_registered',
+    )
+    
     _instance = None
-    _lock = threading.RLock()
-    _persist_file = "app_state.pickle"
-    _auto_persist = False
-    _persist_interval = 30  # seconds
-    _persistence_thread = None
+    _lock = _ReadWriteLock()  # Write side; whole-state writes and `with state._lock:` blocks
+    _read_lock = _lock.reader  # Shared; taken with a stripe lock for single-key access
+    _default_persist_file = "app_state.msgpack" if msgspec is not None else "app_state.pickle"
+    _legacy_persist_file = "app_state.pickle"
+    _stripe_count = 16  # Power of two; a key's stripe is hash(key) & (count - 1)
+    _wal_compact_size = 1 << 20  # Log size that triggers a full snapshot
+    _shutdown_timeout = 10  # Seconds to wait at exit for pending writes
     
     def __new__(cls):
         """Implement singleton pattern to ensure only one state exists."""
+        # Once it exists, hand the instance out without taking the lock
+        instance = cls._instance
+        if instance is not None:
+            return instance
         with cls._lock:
             if cls._instance is None:
-                cls._instance = super(StateManager, cls).__new__(cls)
-                cls._instance._state = {}
-                cls._instance._initialize()
+                instance = super(StateManager, cls).__new__(cls)
+                instance._stripes = [{} for _ in range(cls._stripe_count)]
+                instance._stripe_locks = [threading.RLock() for _ in range(cls._stripe_count)]
+                instance._stripe_mask = cls._stripe_count - 1
+                instance._all_stripes_lock = _StripesLock(cls._lock, instance._stripe_locks)
+                instance._snapshot = None  # See _current_snapshot()
+                instance._dirty = threading.Event()  # Set by every change, cleared on save
+                instance._wal = None  # Write-ahead log, open while auto-persistence is on
+                instance._wal_lock = threading.Lock()
+                instance._wal_incomplete = False  # A change failed to reach the log
+                instance._wal_seq = 0  # Number of the last rotated log
+                instance._write_queue = queue.Queue(maxsize=4)  # Encoded snapshots to write
+                instance._writer_thread = None
+                instance._persist_lock = threading.RLock()  # Starting the writer; taken after _lock
+                instance._persist_seq = 0  # Number of the last snapshot taken
+                instance._persist_file = cls._default_persist_file
+                instance._auto_persist = False
+                instance._persist_interval = 30  # seconds
+                instance._persistence_thread = None
+                instance._wakeup = threading.Event()  # Wakes the auto-save worker early
+                instance._stopping = threading.Event()  # Set once at exit
+                instance._cleanup_registered = False
+                instance._initialize()
+                # Published only once loaded, as the check above reads it unlocked
+                cls._instance = instance
         return cls._instance
 
     def _initialize(self):
         """Initialize the state manager."""
         # Try to load persisted state if it exists
         self._try_load_state()
-        
-        # Register cleanup function to be called on exit
-        atexit.register(self._cleanup)
+    
+    def _register_cleanup(self):
+        """
+        Have _cleanup run at exit. Left until persistence is enabled or a
+        save is queued, as until then there is nothing to clean up.
+        """
+        with self._persist_lock:
+            if not self._cleanup_registered:
+                self._cleanup_registered = True
+                atexit.register(self._cleanup)
     
     def enable_persistence(self, auto_persist: bool = True, 
                           persist_file: Optional[str] = None,
@@ -41,137 +353,565 @@ class StateManager:
         """
         Enable persistence of state to disk.
         
+        With auto_persist, each change is appended to a write-ahead log
+        next to the state file as it happens, and the full state is only
+        rewritten once the log has grown large. Only changes made through
+        the state manager are logged; after changing a stored object in
+        place, assign it again or call persist().
+        
         Args:
             auto_persist: If True, state is automatically saved periodically
             persist_file: Custom file path to save the state
             persist_interval: Interval in seconds between auto-saves
         """
         with self._lock:
+            self._register_cleanup()
+            
             if persist_file:
                 self._persist_file = persist_file
             
             self._auto_persist = auto_persist
             self._persist_interval = persist_interval
             
-            # Start persistence thread if auto_persist is enabled
-            if auto_persist and self._persistence_thread is None:
+            if auto_persist and self._wal is None:
+                # Unbuffered: each record goes out in a single write
+                self._wal = open(self._persist_file + ".wal", "ab", buffering=0)
+            elif not auto_persist and self._wal is not None:
+                self.persist()  # Fold the log into the snapshot before closing it
+                wal_file = self._wal.name
+                self._wal.close()
+                self._wal = None
+                # The log persist() started is still empty, as the lock kept
+                # changes out; one that could not be rotated is left for load
+                try:
+                    if not os.path.getsize(wal_file):
+                        os.remove(wal_file)
+                except IOError:
+                    pass
+            
+            # Start persistence thread if auto_persist is enabled; wake a
+            # running one so it picks up the new interval, or stops
+            if auto_persist and (self._persistence_thread is None or not self._persistence_thread.is_alive()):
                 self._persistence_thread = threading.Thread(
                     target=self._persistence_worker,
                     daemon=True
                 )
                 self._persistence_thread.start()
+            else:
+                self._wakeup.set()
+    
+    def flush(self):
+        """
+        Save pending changes now instead of at the next auto-save, without
+        waiting for them to reach the disk.
+        """
+        worker = self._persistence_thread
+        if self._auto_persist and worker is not None and worker.is_alive():
+            self._wakeup.set()
+        else:
+            self.persist()
     
     def _persistence_worker(self):
         """Background worker that periodically saves state to disk."""
-        while self._auto_persist:
-            time.sleep(self._persist_interval)
-            self.persist()
+        while self._auto_persist and not self._stopping.is_set():
+            # Sleeps out the interval unless flush(), a settings change or
+            # shutdown wakes it early
+            self._wakeup.wait(self._persist_interval)
+            flush_requested = self._wakeup.is_set()
+            self._wakeup.clear()
+            if self._stopping.is_set() or not self._auto_persist:
+                break  # _cleanup or enable_persistence saves what's left
+            
+            # Skip the rewrite when nothing changed; all the changes made
+            # since the last save go out in this one write. Changes already
+            # in the log only need a snapshot once the log has grown large,
+            # unless a flush was asked for.
+            if not self._dirty.is_set():
+                continue
+            if not flush_requested and not self._needs_snapshot():
+                continue
+            self._dirty.clear()
+            if not self.persist():
+                self._dirty.set()  # Retry on the next round
     
     def _try_load_state(self):
         """Try to load state from disk if it exists."""
-        if os.path.exists(self._persist_file):
+        path = self._persist_file
+        if not os.path.exists(path) and os.path.exists(self._legacy_persist_file):
+            # State pickled before persistence moved to msgpack
+            path = self._legacy_persist_file
+        
+        if os.path.exists(path):
             try:
-                with open(self._persist_file, 'rb') as f:
-                    loaded_state = pickle.load(f)
-                    if isinstance(loaded_state, dict):
-                        self._state = loaded_state
-            except (pickle.PickleError, EOFError, IOError) as e:
+                # Decoded from a private copy-on-write mapping, or a bytearray
+                # for small files, rather than copied into bytes first. Values
+                # unpickled over out-of-band buffers share that memory, and
+                # stay writable that way.
+                with open(path, 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if size >= _MMAP_MIN_SIZE:
+                        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+                    else:
+                        data = bytearray(size)
+                        f.readinto(data)
+                
+                # Decoding creates many objects at once; keep the cyclic GC
+                # from repeatedly walking them while it does
+                gc_enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    loaded_state = _decode_state(data, snapshot=True)
+                finally:
+                    if gc_enabled:
+                        gc.enable()
+                    if isinstance(data, mmap.mmap):
+                        try:
+                            data.close()
+                        except BufferError:
+                            pass  # Still shared by loaded values; unmapped once they go
+                
+                if isinstance(loaded_state, dict):
+                    for key, value in loaded_state.items():
+                        self._stripes[self._stripe(key)][key] = value
+            except _DECODE_ERRORS as e:
                 print(f"Error loading persisted state: {e}")
+        
+        # Logs set aside for snapshots that may not have reached the disk,
+        # then the current log
+        for seq, wal_file in self._rotated_wals(self._persist_file):
+            self._replay_wal(wal_file)
+            self._wal_seq = max(self._wal_seq, seq)
+        wal_file = self._persist_file + ".wal"
+        self._replay_wal(wal_file)
+        
+        # Number the replayed log like a rotated one, so the next snapshot
+        # retires it instead of it being replayed over that snapshot later
+        if os.path.exists(wal_file):
+            try:
+                os.replace(wal_file, f"{wal_file}.{self._wal_seq + 1}")
+                self._wal_seq += 1
+            except IOError as e:
+                print(f"Error rotating state log: {e}")
+    
+    def _replay_wal(self, wal_file: str):
+        """Apply the changes logged since the last snapshot."""
+        try:
+            with open(wal_file, 'rb') as f:
+                log = f.read()
+        except FileNotFoundError:
+            return
+        except IOError as e:
+            print(f"Error reading state log: {e}")
+            return
+        
+        offset = 0
+        header_size = _WAL_FRAME_HEADER.size
+        while offset + header_size <= len(log):
+            (size,) = _WAL_FRAME_HEADER.unpack_from(log, offset)
+            frame = log[offset + header_size:offset + header_size + size]
+            if len(frame) < size:
+                break  # Torn final record from an interrupted write
+            offset += header_size + size
+            
+            try:
+                op, *args = _decode_state(frame)
+            except _DECODE_ERRORS + (ValueError, TypeError) as e:
+                print(f"Error replaying state log: {e}")
+                break
+            if op == "set":
+                key, value = args
+                self._stripes[self._stripe(key)][key] = value
+            elif op == "del":
+                self._stripes[self._stripe(args[0])].pop(args[0], None)
+            elif op == "update":
+                for key, value in args[0].items():
+                    self._stripes[self._stripe(key)][key] = value
+            elif op == "clear":
+                for stripe in self._stripes:
+                    stripe.clear()
     
     def persist(self):
-        """Save state to disk."""
+        """
+        Save state to disk.
+        
+        The state is encoded here and handed to a background writer thread,
+        so this returns without waiting for the disk; writes still pending
+        at exit are finished before the interpreter shuts down.
+        
+        Returns:
+            True if the state was encoded and queued for writing
+        """
+        # Only the snapshot and the log rotation need the state held still;
+        # both are quick, and the encode runs after writers resume. Snapshots
+        # are numbered here, so the writer can drop one that is overtaken by
+        # a newer one while being encoded.
         with self._lock:
+            snapshot = self._current_snapshot()
+            persist_file = self._persist_file
+            self._persist_seq += 1
+            seq = self._persist_seq
+            # The snapshot holds everything logged so far; set the open log
+            # aside, so the writer can delete it and the logs rotated before
+            # it once the snapshot is on disk
+            wal_seq = self._rotate_wal()
+            wal_incomplete, self._wal_incomplete = self._wal_incomplete, False
+        
+        try:
+            # Encoded first, so an unencodable value leaves the file as it was
+            chunks = _encode_snapshot(snapshot)
+        except _ENCODE_ERRORS as e:
+            print(f"Error persisting state: {e}")
+            # The rotated log stays on disk and is replayed on load
+            if wal_incomplete:
+                self._wal_incomplete = True
+            return False
+        
+        self._queue_write(seq, chunks, persist_file, wal_seq)
+        return True
+    
+    def _rotate_wal(self) -> int:
+        """
+        Rename the open write-ahead log, if any, to <log>.<n> and start an
+        empty one.
+        
+        Returns:
+            The number of the newest rotated log (0 if there is none); a
+            snapshot taken now covers it and every older one
+        """
+        wal = self._wal
+        if wal is None:
+            return self._wal_seq
+        
+        wal_file = wal.name
+        try:
+            wal.close()
+            os.replace(wal_file, f"{wal_file}.{self._wal_seq + 1}")
+            self._wal_seq += 1
+            return self._wal_seq
+        except IOError as e:
+            print(f"Error rotating state log: {e}")
+            return self._wal_seq  # Keep appending to the old log; replaying it twice is harmless
+        finally:
+            self._wal = open(wal_file, "ab", buffering=0)
+    
+    def _queue_write(self, seq: int, chunks: list, persist_file: str, wal_seq: int):
+        """Queue an encoded snapshot for the writer thread, starting it if needed."""
+        # _persist_lock never waits on _lock, so this is safe from inside a
+        # `with state._lock:` block
+        with self._persist_lock:
+            if self._writer_thread is None:
+                self._register_cleanup()
+                self._writer_thread = threading.Thread(target=self._writer_worker, daemon=True)
+                self._writer_thread.start()
+        
+        item = (seq, chunks, persist_file, wal_seq)
+        while True:
             try:
-                with open(self._persist_file, 'wb') as f:
-                    pickle.dump(self._state, f)
-                return True
-            except (pickle.PickleError, IOError) as e:
+                self._write_queue.put_nowait(item)
+                return
+            except queue.Full:
+                # A newer snapshot supersedes the oldest pending one, and its
+                # write also deletes the logs the dropped one covered
+                try:
+                    self._write_queue.get_nowait()
+                except queue.Empty:
+                    pass
+    
+    def _writer_worker(self):
+        """Background worker that writes queued snapshots; the only writer of the state file."""
+        written_seq = 0
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                return  # Shutdown
+            seq, chunks, persist_file, wal_seq = item
+            if seq < written_seq:
+                # Overtaken while it was encoded; the newer snapshot already
+                # on disk holds everything this one does
+                continue
+            
+            # Write a temporary file and swap it in, so a crash midway
+            # leaves the previous state file intact. The pid keeps processes
+            # sharing a state file from writing the same temporary file.
+            tmp_file = f"{persist_file}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_file, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, persist_file)
+            except IOError as e:
                 print(f"Error persisting state: {e}")
-                return False
+                try:
+                    os.remove(tmp_file)
+                except IOError:
+                    pass
+                self._dirty.set()  # Have the next round try again
+                continue
+            written_seq = seq
+            
+            # The snapshot now holds everything the rotated logs recorded
+            if wal_seq:
+                for seq, wal_file in self._rotated_wals(persist_file):
+                    if seq <= wal_seq:
+                        try:
+                            os.remove(wal_file)
+                        except IOError:
+                            pass
+    
+    def _rotated_wals(self, persist_file: str):
+        """(n, path) of each rotated write-ahead log of persist_file, oldest first."""
+        prefix = persist_file + ".wal."
+        rotated = []
+        for wal_file in glob.glob(glob.escape(prefix) + '*'):
+            suffix = wal_file[len(prefix):]
+            if suffix.isdigit():
+                rotated.append((int(suffix), wal_file))
+        rotated.sort()
+        return rotated
+    
+    def _record(self, *record):
+        """
+        Note that the state has changed since it was last saved and since the
+        readers' snapshot was taken, and append the change to the write-ahead
+        log if one is open.
+        
+        Called with the lock for the changed key (or the write side) held,
+        so records for the same key reach the log in the order they happened.
+        """
+        self._snapshot = None
+        
+        # is_set() is a plain read; set() would take the Event's lock each time
+        if not self._dirty.is_set():
+            self._dirty.set()
+        
+        wal = self._wal
+        if wal is None:
+            return
+        try:
+            data = _encode_state(record)
+            with self._wal_lock:
+                wal.write(_WAL_FRAME_HEADER.pack(len(data)) + data)
+        except _ENCODE_ERRORS as e:
+            print(f"Error logging state change: {e}")
+            self._wal_incomplete = True  # Only a full snapshot can catch up now
+    
+    def _needs_snapshot(self) -> bool:
+        """Whether the write-ahead log should be folded into a full snapshot."""
+        wal = self._wal
+        if wal is None or self._wal_incomplete:
+            return True
+        try:
+            return os.fstat(wal.fileno()).st_size >= self._wal_compact_size
+        except (IOError, ValueError):  # Closed meanwhile
+            return True
+    
+    def _stripe(self, key) -> int:
+        """Index of the stripe that holds key."""
+        return hash(key) & self._stripe_mask
+    
+    def _merged(self) -> Dict[str, Any]:
+        """All stripes as one dict; the caller holds every stripe or the write side."""
+        merged = {}
+        for stripe in self._stripes:
+            merged.update(stripe)
+        return merged
     
     def _cleanup(self):
         """Clean up resources and ensure state is saved if persistence is enabled."""
-        if self._auto_persist:
+        # Stop the auto-save worker first so it doesn't save alongside us
+        self._stopping.set()
+        self._wakeup.set()
+        worker = self._persistence_thread
+        if worker is not None:
+            worker.join(self._shutdown_timeout)
+        
+        if self._auto_persist and self._dirty.is_set():
             self.persist()
+        
+        # Let the writer finish what is queued before the interpreter exits
+        writer = self._writer_thread
+        if writer is not None:
+            self._write_queue.put(None)
+            writer.join(self._shutdown_timeout)
     
-    def __getitem__(self, key):
-        """Allow dictionary-like access with square brackets: state['key']"""
-        with self._lock:
-            return self._state.get(key, None)
+    if _ATOMIC_DICT_READS:
+        def __getitem__(self, key):
+            """Allow dictionary-like access with square brackets: state['key']"""
+            return self._stripes[hash(key) & self._stripe_mask].get(key, None)
+    else:
+        def __getitem__(self, key):
+            """Allow dictionary-like access with square brackets: state['key']"""
+            i = hash(key) & self._stripe_mask
+            with self._read_lock, self._stripe_locks[i]:
+                return self._stripes[i].get(key, None)
     
     def __setitem__(self, key, value):
         """Allow dictionary-like setting with square brackets: state['key'] = value"""
-        with self._lock:
-            self._state[key] = value
+        i = hash(key) & self._stripe_mask
+        with self._read_lock, self._stripe_locks[i]:
+            self._stripes[i][key] = value
+            self._record("set", key, value)
     
     def __delitem__(self, key):
         """Allow dictionary-like deletion with: del state['key']"""
-        with self._lock:
-            if key in self._state:
-                del self._state[key]
+        i = hash(key) & self._stripe_mask
+        with self._read_lock, self._stripe_locks[i]:
+            if self._stripes[i].pop(key, _MISSING) is not _MISSING:
+                self._record("del", key)
     
-    def __contains__(self, key):
-        """Allow 'in' operator: 'key' in state"""
-        with self._lock:
-            return key in self._state
-    
-    def get(self, key, default=None):
-        """Get a value with a default if key doesn't exist"""
-        with self._lock:
-            return self._state.get(key, default)
+    if _ATOMIC_DICT_READS:
+        def __contains__(self, key):
+            """Allow 'in' operator: 'key' in state"""
+            return key in self._stripes[hash(key) & self._stripe_mask]
+        
+        def get(self, key, default=None):
+            """Get a value with a default if key doesn't exist"""
+            return self._stripes[hash(key) & self._stripe_mask].get(key, default)
+    else:
+        def __contains__(self, key):
+            """Allow 'in' operator: 'key' in state"""
+            i = hash(key) & self._stripe_mask
+            with self._read_lock, self._stripe_locks[i]:
+                return key in self._stripes[i]
+        
+        def get(self, key, default=None):
+            """Get a value with a default if key doesn't exist"""
+            i = hash(key) & self._stripe_mask
+            with self._read_lock, self._stripe_locks[i]:
+                return self._stripes[i].get(key, default)
     
     def set(self, key, value):
         """Set a value for a key"""
-        with self._lock:
-            self._state[key] = value
+        i = hash(key) & self._stripe_mask
+        with self._read_lock, self._stripe_locks[i]:
+            self._stripes[i][key] = value
+            self._record("set", key, value)
             return value  # Return value for convenience in chaining
     
     def setdefault(self, key, default=None):
         """Set default value if key doesn't exist and return the value"""
-        with self._lock:
-            if key not in self._state:
-                self._state[key] = default
-            return self._state[key]
+        i = hash(key) & self._stripe_mask
+        with self._read_lock, self._stripe_locks[i]:
+            stripe = self._stripes[i]
+            if key not in stripe:
+                stripe[key] = default
+                self._record("set", key, default)
+            return stripe[key]
     
-    def update(self, **kwargs):
-        """Update multiple state values at once with keyword arguments"""
+    def get_or_compute(self, key, factory):
+        """
+        Return the value for key, storing factory() first if it is missing.
+        
+        Unlike `get(key, expensive())` or setdefault, the default is only
+        computed when the key is missing; the stored value is what later
+        calls return.
+        
+        Args:
+            key: The state key
+            factory: Called without arguments to produce the missing value.
+                It runs outside the state's locks, so it may use the state freely.
+                Threads missing the key at the same time may each call it;
+                the first value stored wins, and all of them return it.
+        """
+        i = hash(key) & self._stripe_mask
+        stripe = self._stripes[i]
+        if _ATOMIC_DICT_READS:
+            value = stripe.get(key, _MISSING)
+        else:
+            with self._read_lock, self._stripe_locks[i]:
+                value = stripe.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        
+        value = factory()
+        with self._read_lock, self._stripe_locks[i]:
+            stored = stripe.get(key, _MISSING)
+            if stored is not _MISSING:
+                return stored  # Stored by another thread meanwhile
+            stripe[key] = value
+            self._record("set", key, value)
+            return value
+    
+    def update(self, mapping=None, /, **kwargs):
+        """
+        Update multiple state values at once, like dict.update.
+        
+        Passing an existing dict as mapping, rather than unpacking it into
+        keyword arguments, saves building a second dict for the call.
+        
+        Args:
+            mapping: A mapping, or an iterable of key-value pairs
+            **kwargs: Further values to set, applied after mapping
+        """
+        if mapping is not None and not isinstance(mapping, dict):
+            mapping = dict(mapping)
+        stripes, mask = self._stripes, self._stripe_mask
         with self._lock:
-            self._state.update(kwargs)
+            for changes in (mapping, kwargs):
+                if not changes:
+                    continue
+                for key, value in changes.items():
+                    stripes[hash(key) & mask][key] = value
+                self._record("update", changes)
     
     def clear(self):
         """Clear all state values"""
         with self._lock:
-            self._state.clear()
+            for stripe in self._stripes:
+                stripe.clear()
+            self._record("clear")
     
     def pop(self, key, default=None):
         """Remove a key and return its value, or default if key not found"""
-        with self._lock:
-            return self._state.pop(key, default)
+        i = hash(key) & self._stripe_mask
+        with self._read_lock, self._stripe_locks[i]:
+            value = self._stripes[i].pop(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._record("del", key)
+            return value
+    
+    def _current_snapshot(self) -> Dict[str, Any]:
+        """
+        The whole state as one dict, shared by readers until the next change.
+        
+        The snapshot is built under every stripe lock and published by a
+        plain attribute assignment; any change drops it (see _record), so
+        readers only pay for a rebuild after the state has changed. It must
+        not be modified.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._all_stripes_lock:
+                snapshot = self._merged()
+                self._snapshot = snapshot
+        return snapshot
+    
+    # The views below read the shared snapshot directly, without copying it:
+    # changes replace the snapshot rather than modify it, so a view keeps
+    # showing the state as it was when taken. Wrap in list() to index.
     
     def keys(self):
-        """Return all keys in the state"""
-        with self._lock:
-            return list(self._state.keys())
+        """Return a read-only view of all keys in the state"""
+        return MappingProxyType(self._current_snapshot()).keys()
     
     def values(self):
-        """Return all values in the state"""
-        with self._lock:
-            return list(self._state.values())
+        """Return a read-only view of all values in the state"""
+        return MappingProxyType(self._current_snapshot()).values()
     
     def items(self):
-        """Return all key-value pairs in the state"""
-        with self._lock:
-            return list(self._state.items())
+        """Return a read-only view of all key-value pairs in the state"""
+        return MappingProxyType(self._current_snapshot()).items()
     
     def copy(self):
         """Return a copy of the state dictionary (thread-safe)"""
-        with self._lock:
-            return dict(self._state)
+        return dict(self._current_snapshot())
     
     def __repr__(self):
         """String representation of the state"""
-        with self._lock:
-            return f"StateManager({self._state})"
+        return f"StateManager({self._current_snapshot()})"
 
 
 # Create a global instance for easy importing
@@ -0,0 +1,57 @@
+"""
+Regression checks for StateManager persistence.
+
+StateManager is a process-wide singleton that loads its state when first
+imported, so each session runs in its own interpreter.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_session(work_dir, code):
+    """Run code against a fresh StateManager in work_dir; returns its stdout."""
+    env = dict(os.environ, PYTHONPATH=_PACKAGE_DIR)
+    result = subprocess.run(
+        [sys.executable, "-c", "import os\nfrom state_manager import state\n" + code],
+        cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+class WriteAheadLogTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.work_dir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_crash_then_manual_persist_then_reload(self):
+        """A log replayed after a crash must not undo a later manual persist()."""
+        run_session(self.work_dir, "state.enable_persistence(auto_persist=True)\n"
+                                   "state['a'] = 1\n"
+                                   "os._exit(0)")
+        run_session(self.work_dir, "assert state['a'] == 1\n"
+                                   "state['a'] = 2\n"
+                                   "state.persist()")
+        self.assertEqual(run_session(self.work_dir, "print(state['a'])").strip(), "2")
+        self.assertFalse([name for name in os.listdir(self.work_dir) if ".wal" in name])
+
+    def test_disabling_auto_persist_retires_the_log(self):
+        """Changes made after auto-persist is turned off survive a reload."""
+        run_session(self.work_dir, "state.enable_persistence(auto_persist=True)\n"
+                                   "state['a'] = 1\n"
+                                   "state.enable_persistence(auto_persist=False)\n"
+                                   "state['a'] = 2\n"
+                                   "state.persist()")
+        self.assertEqual(run_session(self.work_dir, "print(state['a'])").strip(), "2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,206 +1,404 @@
-import os
+import hashlib
+import posixpath
 import shutil
+import struct
+import time
 import zipfile
-import xml.etree.ElementTree as ET
+import io
+import mmap
+import os
+from lxml import etree as ET
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import re
 import uuid
 
+try:
+    # ISA-L deflate/CRC32: same stream format as zlib, several times faster
+    from isal import isal_zlib as _deflate
+except ImportError:
+    import zlib as _deflate
+
+# libxml2 parser shared by every parse; huge_tree lifts the depth/size limits
+# that large slide XML can hit
+_XML_PARSER = ET.XMLParser(remove_blank_text=False, huge_tree=True)
+
+# Compiled once: every element carrying an Id attribute (relationship entries)
+_ELEMENTS_WITH_ID = ET.XPath('//*[@Id]')
+
+# Namespace part of a Clark-notation tag
+_NAMESPACE_PATTERN = re.compile(r'\{([^}]*)\}')
+
+# rId numbers in a serialized relationships part
+_REL_ID_PATTERN = re.compile(rb'\bId\s*=\s*["\']rId(\d+)["\']')
+
+# Namespace of r:id and the other relationship-reference attributes
+_R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# [Content_Types].xml entry tags
+_CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+_CT_DEFAULT = f"{{{_CT_NS}}}Default"
+_CT_OVERRIDE = f"{{{_CT_NS}}}Override"
+
+# Buffer size for copies that can't go through sendfile
+_COPY_BUFFER_SIZE = 128 * 1024
+
+# Compression methods whose raw bytes can be moved between archives as-is
+_RAW_COPY_METHODS = (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED)
+
+# Below this, mapping the archive costs more than reading the member
+_MMAP_MIN_SIZE = 1 << 20
+
 def merge_presentations(base_ppt_path, add_ppt_path, output_path):
     """
     Merge two PowerPoint presentations using XML manipulation.
     
+    Both packages are read straight from their zip archives: only the XML
+    parts that change are parsed and rewritten in memory, and every other
+    member is streamed from its input archive into the output.
+    
     Args:
         base_ppt_path (str): Path to the first presentation (base presentation)
         add_ppt_path (str): Path to the second presentation to be added
         output_path (str): Path where the merged presentation will be saved
     """
-    # Create temporary directories
-    temp_dir = "temp_ppt_merge"
-    base_dir = os.path.join(temp_dir, "base")
-    add_dir = os.path.join(temp_dir, "add")
-    
     try:
-        # Create directories if they don't exist
-        for dir_path in [temp_dir, base_dir, add_dir]:
-            if not os.path.exists(dir_path):
-                os.makedirs(dir_path)
-        
-        # Extract both presentations
-        extract_pptx(base_ppt_path, base_dir)
-        extract_pptx(add_ppt_path, add_dir)
-        
-        # Get slide count from base presentation
-        presentation_xml_path = os.path.join(base_dir, "ppt", "presentation.xml")
-        tree = ET.parse(presentation_xml_path)
-        root = tree.getroot()
-        
-        # Find namespace
-        ns = get_namespace(root)
-        # Create namespace map for finding elements
-        nsmap = {'p': ns}
-        
-        # Find slide references
-        slides_element = root.find('.//p:sldIdLst', nsmap)
-        if slides_element is None:
-            slides_element = ET.SubElement(root.find('.//p:presentation', nsmap), f'{{{ns}}}sldIdLst')
-        
-        # Get highest slide ID from base presentation
-        slide_ids = [int(slide_id.get('id')) for slide_id in slides_element.findall('./p:sldId', nsmap)]
-        max_slide_id = max(slide_ids) if slide_ids else 255
-        
-        # Get current relationships
-        rels_path = os.path.join(base_dir, "ppt", "_rels", "presentation.xml.rels")
-        rels_tree = ET.parse(rels_path)
-        rels_root = rels_tree.getroot()
-        
-        # Find highest relationship ID
-        rel_ids = [int(rel.get('Id').replace('rId', '')) for rel in rels_root.findall('.//*[@Id]')]
-        max_rel_id = max(rel_ids) if rel_ids else 0
-        
-        # Track new media and relationships
-        added_media = {}
-        slide_rel_map = {}
-        
-        # Process each slide in the second presentation
-        add_pres_xml_path = os.path.join(add_dir, "ppt", "presentation.xml")
-        add_tree = ET.parse(add_pres_xml_path)
-        add_root = add_tree.getroot()
-        
-        # Find slide references in the presentation to be added
-        add_slides_element = add_root.find('.//p:sldIdLst', {'p': get_namespace(add_root)})
-        if add_slides_element is None:
-            print("No slides found in the presentation to be added.")
-            return
-        
-        # Process each slide in the second presentation
-        for slide_id_elem in add_slides_element.findall('./p:sldId', {'p': get_namespace(add_root)}):
-            # Get the relationship ID for this slide
-            rid = slide_id_elem.get(f'{{{get_namespace(add_root, "r")}}}id')
+        with zipfile.ZipFile(base_ppt_path, 'r') as base_zip, \
+                zipfile.ZipFile(add_ppt_path, 'r') as add_zip:
+            # Output entries in the base package's member order. Members
+            # copied unchanged are held as (zip, info); rewritten ones as bytes.
+            parts = {info.filename: (base_zip, info) for info in base_zip.infolist()}
             
-            # Find the corresponding relationship
-            add_rels_path = os.path.join(add_dir, "ppt", "_rels", "presentation.xml.rels")
-            add_rels_tree = ET.parse(add_rels_path)
-            add_rels_root = add_rels_tree.getroot()
+            # Get slide count from base presentation
+            presentation_xml_path = "ppt/presentation.xml"
+            root = parse_xml(read_entry(parts, presentation_xml_path))
             
-            slide_rel = None
-            for rel in add_rels_root.findall('.//*[@Id]'):
-                if rel.get('Id') == rid:
-                    slide_rel = rel
-                    break
+            # Find namespaces once; they're fixed for the whole document
+            ns = get_namespace(root)
+            r_ns = get_namespace(root, 'r')
+            # Create namespace map for finding elements
+            nsmap = {'p': ns}
+            sld_id_tag = f'{{{ns}}}sldId'
+            r_id_attr = f'{{{r_ns}}}id'
             
-            if slide_rel is None:
-                continue
+            # Find slide references
+            slides_element = root.find('.//p:sldIdLst', nsmap)
+            if slides_element is None:
+                slides_element = ET.SubElement(root.find('.//p:presentation', nsmap), f'{{{ns}}}sldIdLst')
             
-            # Get the slide path
-            slide_path = slide_rel.get('Target')
-            full_add_slide_path = os.path.join(add_dir, "ppt", slide_path)
+            # Get highest slide ID from base presentation
+            slide_ids = [int(slide_id.get('id')) for slide_id in slides_element.iterfind('./p:sldId', nsmap)]
+            max_slide_id = max(slide_ids) if slide_ids else 255
             
-            if not os.path.exists(full_add_slide_path):
-                continue
+            # Get current relationships. It's a flat list of Relationship
+            # elements, so it's handled as bytes rather than parsed.
+            rels_path = "ppt/_rels/presentation.xml.rels"
+            rels_data = read_entry(parts, rels_path)
+            new_rels = []
             
-            # Create new slide IDs
-            max_slide_id += 1
-            max_rel_id += 1
-            new_slide_id = str(max_slide_id)
-            new_rel_id = f'rId{max_rel_id}'
+            # Find highest relationship ID
+            rel_ids = [int(rel_id) for rel_id in _REL_ID_PATTERN.findall(rels_data)]
+            max_rel_id = max(rel_ids) if rel_ids else 0
             
-            # Copy slide file
-            slide_filename = os.path.basename(slide_path)
-            new_slide_path = f"slides/slide{max_slide_id}.xml"
-            full_new_slide_path = os.path.join(base_dir, "ppt", new_slide_path)
+            # Track new media and relationships
+            added_media = {}
+            media_by_checksum = {}
+            slide_rel_map = {}
             
-            # Create slides directory if it doesn't exist
-            slides_dir = os.path.join(base_dir, "ppt", "slides")
-            if not os.path.exists(slides_dir):
-                os.makedirs(slides_dir)
+            # Process each slide in the second presentation
+            add_root = parse_xml(add_zip.read("ppt/presentation.xml"))
+            add_nsmap = {'p': get_namespace(add_root)}
+            add_r_id_attr = f'{{{get_namespace(add_root, "r")}}}id'
             
-            # Copy slide XML
-            shutil.copy2(full_add_slide_path, full_new_slide_path)
+            # Find slide references in the presentation to be added
+            add_slides_element = add_root.find('.//p:sldIdLst', add_nsmap)
+            if add_slides_element is None:
+                print("No slides found in the presentation to be added.")
+                return
             
-            # Add slide reference to presentation.xml
-            new_slide_elem = ET.SubElement(slides_element, f'{{{ns}}}sldId')
-            new_slide_elem.set('id', new_slide_id)
-            new_slide_elem.set(f'{{{get_namespace(root, "r")}}}id', new_rel_id)
+            # Parse the added presentation's relationships once and index them by Id
+            add_rels_root = parse_xml(add_zip.read("ppt/_rels/presentation.xml.rels"))
+            add_rels_by_id = {rel.get('Id'): rel for rel in _ELEMENTS_WITH_ID(add_rels_root)}
             
-            # Add relationship to presentation.xml.rels
-            new_rel_elem = ET.SubElement(rels_root, f'{{{get_namespace(rels_root)}}}Relationship')
-            new_rel_elem.set('Id', new_rel_id)
-            new_rel_elem.set('Type', "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide")
-            new_rel_elem.set('Target', new_slide_path)
+            # Resolve the slides to copy, in presentation order
+            slide_paths = []
+            for slide_id_elem in add_slides_element.iterfind('./p:sldId', add_nsmap):
+                # Get the relationship ID for this slide
+                rid = slide_id_elem.get(add_r_id_attr)
+                
+                # Find the corresponding relationship
+                slide_rel = add_rels_by_id.get(rid)
+                
+                if slide_rel is None:
+                    continue
+                
+                # Get the slide path
+                slide_path = slide_rel.get('Target')
+                if has_member(add_zip, f"ppt/{slide_path}"):
+                    slide_paths.append(slide_path)
             
-            # Process slide's relationships (images, charts, etc.)
-            process_slide_relationships(base_dir, add_dir, slide_path, new_slide_path, added_media)
+            # Read and inflate every slide's relationships on a thread pool
+            # (zlib releases the GIL). IDs, media names and the output entries
+            # are assigned below in slide order, so the result is deterministic.
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+                slide_rels_data = list(executor.map(
+                    partial(read_slide_rels, add_zip), slide_paths))
             
-        # Save modified files
-        tree.write(presentation_xml_path, encoding='UTF-8', xml_declaration=True)
-        rels_tree.write(rels_path, encoding='UTF-8', xml_declaration=True)
-        
-        # Update content types
-        update_content_types(base_dir)
-        
-        # Create the merged presentation
-        create_pptx(base_dir, output_path)
+            # Process each slide in the second presentation
+            for slide_path, slide_rels in zip(slide_paths, slide_rels_data):
+                add_slide_name = f"ppt/{slide_path}"
+                
+                # Create new slide IDs
+                max_slide_id += 1
+                max_rel_id += 1
+                new_slide_id = str(max_slide_id)
+                new_rel_id = f'rId{max_rel_id}'
+                
+                # Copy slide XML
+                new_slide_path = f"slides/slide{max_slide_id}.xml"
+                parts[f"ppt/{new_slide_path}"] = (add_zip, add_zip.getinfo(add_slide_name))
+                
+                # Add slide reference to presentation.xml
+                new_slide_elem = ET.SubElement(slides_element, sld_id_tag)
+                new_slide_elem.set('id', new_slide_id)
+                new_slide_elem.set(r_id_attr, new_rel_id)
+                
+                # Add relationship to presentation.xml.rels
+                new_rels.append(
+                    f'<Relationship Id="{new_rel_id}" '
+                    f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide" '
+                    f'Target="{new_slide_path}"/>')
+                
+                # Process slide's relationships (images, charts, etc.)
+                process_slide_relationships(
+                    add_zip, parts, slide_path, new_slide_path, added_media, media_by_checksum, slide_rels)
+            
+            # Save modified files
+            parts[presentation_xml_path] = serialize_xml(root)
+            parts[rels_path] = append_relationships(rels_data, new_rels)
+            
+            # Update content types
+            update_content_types(parts)
+            
+            # Create the merged presentation
+            create_pptx(parts, output_path)
         
         print(f"Successfully merged presentations into {output_path}")
         
     except Exception as e:
         print(f"Error merging presentations: {e}")
-    finally:
-        # Clean up temporary files
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-
-def extract_pptx(pptx_path, extract_dir):
-    """Extract a .pptx file to the specified directory."""
-    with zipfile.ZipFile(pptx_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
-
-def create_pptx(source_dir, output_path):
-    """Create a .pptx file from the specified directory."""
-    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
-        for root, _, files in os.walk(source_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, source_dir)
-                zip_ref.write(file_path, arcname)
+
+def parse_xml(data):
+    """Parse an XML part held in memory."""
+    return ET.fromstring(data, _XML_PARSER)
+
+def serialize_xml(root):
+    """Serialize an XML part, with its declaration, for writing to the package."""
+    return ET.tostring(root, encoding='UTF-8', xml_declaration=True)
+
+def append_relationships(rels_data, new_rels):
+    """Splice serialized Relationship elements into the end of a rels part."""
+    closing_tag = b'</Relationships>'
+    end = rels_data.rfind(closing_tag)
+    if end == -1:
+        raise ValueError("Could not find the end of the relationships list")
+    return rels_data[:end] + ''.join(new_rels).encode('utf-8') + rels_data[end:]
+
+def has_member(zip_ref, name):
+    """Check whether a zip archive contains a member, without listing it."""
+    try:
+        zip_ref.getinfo(name)
+    except KeyError:
+        return False
+    return True
+
+def read_entry(parts, name):
+    """Return the content of an output entry, reading it from its archive if needed."""
+    entry = parts[name]
+    if isinstance(entry, bytes):
+        return entry
+    zip_ref, info = entry
+    return zip_ref.read(info)
+
+def create_pptx(parts, output_path):
+    """Create a .pptx file from the output entries."""
+    # Many small header/XML writes: give them a 128 KiB buffer
+    with open(output_path, 'wb', buffering=_COPY_BUFFER_SIZE) as output_file:
+        with zipfile.ZipFile(output_file, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for arcname, entry in parts.items():
+                if isinstance(entry, bytes):
+                    write_deflated(zip_ref, arcname, entry)
+                    continue
+            
+                source_zip, info = entry
+                if info.compress_type in _RAW_COPY_METHODS and not info.flag_bits & 0x1:
+                    # Unchanged, unencrypted member: move its compressed bytes as-is
+                    copy_raw_member(zip_ref, source_zip, info, arcname)
+                    continue
+
+                # Otherwise stream it across instead of holding it all in memory
+                out_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+                out_info.compress_type = zipfile.ZIP_DEFLATED
+                out_info.file_size = info.file_size  # Lets zipfile decide on zip64
+                with source_zip.open(info) as src, zip_ref.open(out_info, 'w') as dst:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+
+def copy_file_range(src, dst, count):
+    """
+    Copy count bytes from src's current position to dst's, using
+    os.sendfile when both are real files so the data stays in the kernel.
+
+    Args:
+        src: Readable binary file object
+        dst: Writable binary file object
+        count (int): Number of bytes to copy
+    """
+    try:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        src_fd = dst_fd = None
+
+    if src_fd is not None and hasattr(os, 'sendfile'):
+        # Bypass the buffered layers: sendfile works on the raw descriptors
+        offset = src.tell()
+        dst.flush()
+        dst_pos = dst.tell()
+        copied = 0
+        try:
+            while copied < count:
+                sent = os.sendfile(dst_fd, src_fd, offset + copied, count - copied)
+                if not sent:
+                    raise zipfile.BadZipFile("Unexpected end of data while copying member")
+                copied += sent
+        except OSError:
+            if copied:
+                raise
+            # Not supported for this pair of files; fall back to a buffered copy
+        else:
+            src.seek(offset + count)
+            dst.seek(dst_pos + count)
+            return
+
+    remaining = count
+    while remaining:
+        chunk = src.read(min(remaining, _COPY_BUFFER_SIZE))
+        if not chunk:
+            raise zipfile.BadZipFile("Unexpected end of data while copying member")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+def copy_raw_member(zip_out, source_zip, info, arcname):
+    """
+    Copy a member's compressed bytes into another archive, skipping the
+    inflate/deflate round trip.
+
+    Args:
+        zip_out (ZipFile): Archive being written
+        source_zip (ZipFile): Archive holding the member
+        info (ZipInfo): Member to copy
+        arcname (str): Name of the member in zip_out
+    """
+    out_info = zipfile.ZipInfo(arcname, date_time=info.date_time)
+    out_info.compress_type = info.compress_type
+    out_info.CRC = info.CRC
+    out_info.compress_size = info.compress_size
+    out_info.file_size = info.file_size
+    out_info.external_attr = info.external_attr
+
+    with source_zip._lock, zip_out._lock:
+        source_fp = source_zip.fp
+        source_fp.seek(member_data_offset(source_zip, info))
+
+        start_member(zip_out, out_info)
+        copy_file_range(source_fp, zip_out.fp, info.compress_size)
+        finish_member(zip_out, out_info)
+
+def member_data_offset(source_zip, info):
+    """Offset of a member's (compressed) data in its archive file."""
+    # The local header's name/extra lengths can differ from the central directory's
+    source_zip.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, source_zip.fp.read(zipfile.sizeFileHeader))
+    return (info.header_offset + zipfile.sizeFileHeader
+            + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+def write_deflated(zip_out, arcname, data):
+    """
+    Deflate an in-memory part and add it to an archive, using ISA-L's
+    SIMD deflate and CRC32 when the isal package is installed.
+
+    Args:
+        zip_out (ZipFile): Archive being written
+        arcname (str): Name of the member in zip_out
+        data (bytes): Uncompressed member contents
+    """
+    compressor = _deflate.compressobj(_deflate.Z_DEFAULT_COMPRESSION, _deflate.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+
+    out_info = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+    out_info.compress_type = zipfile.ZIP_DEFLATED
+    out_info.CRC = _deflate.crc32(data)
+    out_info.compress_size = len(compressed)
+    out_info.file_size = len(data)
+    out_info.external_attr = 0o600 << 16  # Same permissions writestr() gives
+
+    with zip_out._lock:
+        start_member(zip_out, out_info)
+        zip_out.fp.write(compressed)
+        finish_member(zip_out, out_info)
+
+def start_member(zip_out, out_info):
+    """Write the local header of a member whose sizes and CRC are already known."""
+    zip_out.fp.seek(zip_out.start_dir)
+    out_info.header_offset = zip_out.fp.tell()
+    zip_out.fp.write(out_info.FileHeader())
+
+def finish_member(zip_out, out_info):
+    """Register a member written with start_member in the central directory."""
+    zip_out.filelist.append(out_info)
+    zip_out.NameToInfo[out_info.filename] = out_info
+    zip_out.start_dir = zip_out.fp.tell()
+    zip_out._didModify = True
 
 def get_namespace(element, prefix='p'):
     """Extract namespace from an XML element."""
-    m = re.match(r'\{(.*)\}', element.tag)
+    m = _NAMESPACE_PATTERN.match(element.tag)
     if m:
         namespace = m.group(1)
         if prefix == 'p':
             return namespace
         elif prefix == 'r':
-            return namespace.replace('schemas.openxmlformats.org/presentationml', 
-                                   'schemas.openxmlformats.org/officeDocument')
+            return _R_NS
     return ""
 
-def process_slide_relationships(base_dir, add_dir, slide_path, new_slide_path, added_media):
-    """Process relationships of a slide, copying media files as needed."""
-    # Get slide relationships
-    slide_rel_dir = os.path.join(add_dir, "ppt", os.path.dirname(slide_path), "_rels")
-    slide_rel_file = os.path.basename(slide_path) + ".rels"
-    slide_rel_path = os.path.join(slide_rel_dir, slide_rel_file)
+def read_slide_rels(add_zip, slide_path):
+    """Read a slide's relationships part, or None if it has none."""
+    slide_rel_path = posixpath.join(
+        "ppt", posixpath.dirname(slide_path), "_rels", posixpath.basename(slide_path) + ".rels")
     
-    # Create target relationships directory if needed
-    target_rel_dir = os.path.join(base_dir, "ppt", os.path.dirname(new_slide_path), "_rels")
-    if not os.path.exists(target_rel_dir):
-        os.makedirs(target_rel_dir)
+    if not has_member(add_zip, slide_rel_path):
+        return None
+    return add_zip.read(slide_rel_path)
+
+def process_slide_relationships(add_zip, parts, slide_path, new_slide_path, added_media,
+                                media_by_checksum, rels_data):
+    """
+    Process relationships of a slide, copying media files as needed.
     
-    target_rel_path = os.path.join(target_rel_dir, os.path.basename(new_slide_path) + ".rels")
+    Media with identical bytes is stored once, whatever its source name.
+    """
+    target_rel_path = posixpath.join(
+        "ppt", posixpath.dirname(new_slide_path), "_rels", posixpath.basename(new_slide_path) + ".rels")
     
-    if not os.path.exists(slide_rel_path):
+    if rels_data is None:
         # No relationships to process
         return
     
     # Parse relationships
-    rels_tree = ET.parse(slide_rel_path)
-    rels_root = rels_tree.getroot()
+    rels_root = parse_xml(rels_data)
     
     # Process each relationship
-    for rel in rels_root.findall('.//*[@Target]'):
+    for rel in rels_root.iterfind('.//*[@Target]'):
         target = rel.get('Target')
         rel_type = rel.get('Type')
         
@@ -209,27 +407,35 @@ def process_slide_relationships(base_dir, add_dir, slide_path, new_slide_path, a
             # Check if target is a local path
             if not target.startswith('http'):
                 # Get media file path
-                media_path = os.path.normpath(os.path.join(os.path.dirname(slide_path), target))
+                media_path = posixpath.normpath(posixpath.join(posixpath.dirname(slide_path), target))
                 
                 # Compute absolute paths
-                source_media_path = os.path.join(add_dir, "ppt", media_path)
+                source_media_path = f"ppt/{media_path}"
                 
-                # Generate a unique path for the media file
+                # Generate a unique path for the media file, skipping names
+                # the base package already uses
                 if media_path not in added_media:
                     # Extract extension
-                    _, ext = os.path.splitext(media_path)
-                    new_filename = f"media/image{len(added_media) + 1}{ext}"
-                    added_media[media_path] = new_filename
+                    _, ext = posixpath.splitext(media_path)
+                    source_info = add_zip.getinfo(source_media_path) if has_member(add_zip, source_media_path) else None
+                    new_filename = None
+                    if source_info is not None:
+                        new_filename = find_duplicate_media(add_zip, source_info, ext, media_by_checksum)
                     
-                    # Ensure media directory exists
-                    media_dir = os.path.join(base_dir, "ppt", "media")
-                    if not os.path.exists(media_dir):
-                        os.makedirs(media_dir)
-                    
-                    # Copy media file
-                    target_media_path = os.path.join(base_dir, "ppt", new_filename)
-                    if os.path.exists(source_media_path):
-                        shutil.copy2(source_media_path, target_media_path)
+                    if new_filename is None:
+                        media_index = len(added_media) + 1
+                        new_filename = f"media/image{media_index}{ext}"
+                        while f"ppt/{new_filename}" in parts:
+                            media_index += 1
+                            new_filename = f"media/image{media_index}{ext}"
+                        
+                        # Copy media file
+                        if source_info is not None:
+                            parts[f"ppt/{new_filename}"] = (add_zip, source_info)
+                            media_by_checksum.setdefault(
+                                (ext, source_info.file_size, source_info.CRC), []).append(
+                                    [source_info, new_filename, None])
+                    added_media[media_path] = new_filename
                 
                 # Update relationship target
                 rel.set('Target', f"../{added_media[media_path]}")
@@ -237,100 +443,128 @@ def process_slide_relationships(base_dir, add_dir, slide_path, new_slide_path, a
         # Handle charts
         elif 'chart' in rel_type:
             # Get chart path
-            chart_path = os.path.normpath(os.path.join(os.path.dirname(slide_path), target))
+            chart_path = posixpath.normpath(posixpath.join(posixpath.dirname(slide_path), target))
             
             # Compute absolute paths
-            source_chart_path = os.path.join(add_dir, "ppt", chart_path)
+            source_chart_path = f"ppt/{chart_path}"
             
             # Generate a unique ID for the chart
             chart_id = f"chart{uuid.uuid4().hex[:8]}"
             new_chart_path = f"charts/{chart_id}.xml"
             
-            # Ensure charts directory exists
-            charts_dir = os.path.join(base_dir, "ppt", "charts")
-            if not os.path.exists(charts_dir):
-                os.makedirs(charts_dir)
-            
             # Copy chart file
-            target_chart_path = os.path.join(base_dir, "ppt", new_chart_path)
-            if os.path.exists(source_chart_path):
-                shutil.copy2(source_chart_path, target_chart_path)
+            if has_member(add_zip, source_chart_path):
+                parts[f"ppt/{new_chart_path}"] = (add_zip, add_zip.getinfo(source_chart_path))
                 
                 # Process chart relationships
-                chart_rel_dir = os.path.join(add_dir, "ppt", "charts", "_rels")
-                chart_rel_file = os.path.basename(chart_path) + ".rels"
-                chart_rel_path = os.path.join(chart_rel_dir, chart_rel_file)
+                chart_rel_path = posixpath.join(
+                    "ppt", "charts", "_rels", posixpath.basename(chart_path) + ".rels")
+                target_chart_rel_path = f"ppt/charts/_rels/{chart_id}.xml.rels"
                 
-                # Create target relationships directory if needed
-                target_chart_rel_dir = os.path.join(base_dir, "ppt", "charts", "_rels")
-                if not os.path.exists(target_chart_rel_dir):
-                    os.makedirs(target_chart_rel_dir)
-                
-                target_chart_rel_path = os.path.join(target_chart_rel_dir, chart_id + ".xml.rels")
-                
-                if os.path.exists(chart_rel_path):
+                if has_member(add_zip, chart_rel_path):
                     # Copy and update chart relationships
-                    process_chart_relationships(chart_rel_path, target_chart_rel_path, base_dir, add_dir)
+                    process_chart_relationships(add_zip, parts, chart_rel_path, target_chart_rel_path)
             
             # Update relationship target
             rel.set('Target', f"../{new_chart_path}")
     
     # Save the updated relationships
-    rels_tree.write(target_rel_path, encoding='UTF-8', xml_declaration=True)
+    parts[target_rel_path] = serialize_xml(rels_root)
+
+def find_duplicate_media(add_zip, info, ext, media_by_checksum):
+    """
+    Find media already copied with the same bytes as a member.
+    
+    Candidates are narrowed by extension, size and the CRC32 stored in the
+    zip directory, so members are only inflated and hashed on a match.
+    
+    Args:
+        add_zip (ZipFile): Archive holding the member
+        info (ZipInfo): Media member about to be copied
+        ext (str): Extension of the member's name
+        media_by_checksum (dict): (ext, size, CRC) -> [[info, new_filename, digest]]
+            for the media copied so far; digests are filled in on first use
+    
+    Returns:
+        str or None: Name the identical media was stored under
+    """
+    candidates = media_by_checksum.get((ext, info.file_size, info.CRC))
+    if not candidates:
+        return None
+    
+    digest = media_digest(add_zip, info)
+    for candidate in candidates:
+        if candidate[2] is None:
+            candidate[2] = media_digest(add_zip, candidate[0])
+        if candidate[2] == digest:
+            return candidate[1]
+    return None
+
+def media_digest(add_zip, info):
+    """BLAKE2b digest of a member's uncompressed bytes, hashed in 1 MiB chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    
+    if info.compress_type == zipfile.ZIP_STORED and info.file_size >= _MMAP_MIN_SIZE:
+        # Stored (already-compressed media, large xlsx): hash it straight
+        # out of a read-only mapping of the archive, with no read copies
+        try:
+            fileno = add_zip.fp.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            fileno = None
+        if fileno is not None:
+            with add_zip._lock:
+                offset = member_data_offset(add_zip, info)
+            with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped, \
+                    memoryview(mapped) as view:
+                for start in range(offset, offset + info.file_size, 1 << 20):
+                    digest.update(view[start:min(start + (1 << 20), offset + info.file_size)])
+            return digest.digest()
+    
+    with add_zip.open(info) as media_file:
+        for chunk in iter(partial(media_file.read, 1 << 20), b''):
+            digest.update(chunk)
+    return digest.digest()
 
-def process_chart_relationships(chart_rel_path, target_chart_rel_path, base_dir, add_dir):
+def process_chart_relationships(add_zip, parts, chart_rel_path, target_chart_rel_path):
     """Process relationships of a chart, copying related files as needed."""
-    if not os.path.exists(chart_rel_path):
+    if not has_member(add_zip, chart_rel_path):
         return
     
     # Parse relationships
-    rels_tree = ET.parse(chart_rel_path)
-    rels_root = rels_tree.getroot()
+    rels_root = parse_xml(add_zip.read(chart_rel_path))
     
     # Process each relationship
-    for rel in rels_root.findall('.//*[@Target]'):
+    for rel in rels_root.iterfind('.//*[@Target]'):
         target = rel.get('Target')
         rel_type = rel.get('Type')
         
         # Handle embedded Excel data
         if 'package' in rel_type and '.xlsx' in target:
-            # Get Excel path
-            excel_path = target
-            if excel_path.startswith('../'):
-                excel_path = excel_path[3:]  # Remove leading '../'
-            
-            # Compute absolute paths
-            source_excel_path = os.path.join(add_dir, excel_path)
+            # Get Excel path; targets are relative to the ppt/charts folder
+            source_excel_path = posixpath.normpath(posixpath.join("ppt", "charts", target))
             
             # Generate a unique ID for the Excel file
             excel_id = f"embeddings/Microsoft_Excel_Sheet{uuid.uuid4().hex[:8]}.xlsx"
             
-            # Ensure embeddings directory exists
-            embed_dir = os.path.join(base_dir, "embeddings")
-            if not os.path.exists(embed_dir):
-                os.makedirs(embed_dir)
-            
             # Copy Excel file
-            target_excel_path = os.path.join(base_dir, excel_id)
-            if os.path.exists(source_excel_path):
-                shutil.copy2(source_excel_path, target_excel_path)
+            if has_member(add_zip, source_excel_path):
+                parts[f"ppt/{excel_id}"] = (add_zip, add_zip.getinfo(source_excel_path))
             
             # Update relationship target
             rel.set('Target', f"../{excel_id}")
     
     # Save the updated relationships
-    rels_tree.write(target_chart_rel_path, encoding='UTF-8', xml_declaration=True)
+    parts[target_chart_rel_path] = serialize_xml(rels_root)
 
-def update_content_types(base_dir):
+def update_content_types(parts):
     """Update the [Content_Types].xml file to include all content types."""
-    content_types_path = os.path.join(base_dir, "[Content_Types].xml")
+    content_types_path = "[Content_Types].xml"
     
-    if not os.path.exists(content_types_path):
+    if content_types_path not in parts:
         return
     
     # Parse content types
-    tree = ET.parse(content_types_path)
-    root = tree.getroot()
+    root = parse_xml(read_entry(parts, content_types_path))
     
     # Ensure all needed content types are present
     content_types = {
@@ -353,45 +587,36 @@ def update_content_types(base_dir):
         ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
     }
     
+    # Collect the new entries and append them in one go
+    new_elements = []
+    
     # Check for existing defaults and add missing ones
-    existing_defaults = {ext.get('Extension'): True for ext in root.findall(".//{*}Default")}
+    existing_defaults = {ext.get('Extension') for ext in root.iter(_CT_DEFAULT)}
     
     for ext, mime in extensions.items():
         ext_clean = ext[1:]  # Remove the leading dot
         if ext_clean not in existing_defaults:
-            default = ET.SubElement(root, "{http://schemas.openxmlformats.org/package/2006/content-types}Default")
-            default.set('Extension', ext_clean)
-            default.set('ContentType', mime)
+            new_elements.append(ET.Element(_CT_DEFAULT, Extension=ext_clean, ContentType=mime))
     
     # Check for existing overrides and add missing ones
-    existing_overrides = {}
-    for override in root.findall(".//{*}Override"):
-        part_name = override.get('PartName')
-        if part_name:
-            existing_overrides[part_name] = True
+    existing_overrides = {override.get('PartName') for override in root.iter(_CT_OVERRIDE)}
     
-    # Add overrides for slides
-    slide_pattern = re.compile(r'/ppt/slides/slide(\d+)\.xml')
-    for slide_file in os.listdir(os.path.join(base_dir, "ppt", "slides")):
-        if slide_file.endswith('.xml'):
-            part_name = f"/ppt/slides/{slide_file}"
+    # Add overrides for slides and charts
+    folder_content_types = {
+        "ppt/slides": content_types["slides"],
+        "ppt/charts": content_types["chart"],
+    }
+    for arcname in parts:
+        content_type = folder_content_types.get(posixpath.dirname(arcname))
+        if content_type is not None and arcname.endswith('.xml'):
+            part_name = f"/{arcname}"
             if part_name not in existing_overrides:
-                override = ET.SubElement(root, "{http://schemas.openxmlformats.org/package/2006/content-types}Override")
-                override.set('PartName', part_name)
-                override.set('ContentType', content_types["slides"])
+                new_elements.append(ET.Element(_CT_OVERRIDE, PartName=part_name, ContentType=content_type))
     
-    # Add overrides for charts
-    if os.path.exists(os.path.join(base_dir, "ppt", "charts")):
-        for chart_file in os.listdir(os.path.join(base_dir, "ppt", "charts")):
-            if chart_file.endswith('.xml'):
-                part_name = f"/ppt/charts/{chart_file}"
-                if part_name not in existing_overrides:
-                    override = ET.SubElement(root, "{http://schemas.openxmlformats.org/package/2006/content-types}Override")
-                    override.set('PartName', part_name)
-                    override.set('ContentType', content_types["chart"])
+    root.extend(new_elements)
     
     # Save the updated content types
-    tree.write(content_types_path, encoding='UTF-8', xml_declaration=True)
+    parts[content_types_path] = serialize_xml(root)
 
 # Example usage
 if __name__ == "__main__":